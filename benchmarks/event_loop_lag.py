@@ -0,0 +1,81 @@
+"""Measure event loop lag while large pages are parsed and matched.
+
+Run from the repository root::
+
+    python benchmarks/event_loop_lag.py --pages 8 --size-kb 2048
+
+Pages are processed through :class:`~services.martech.cpu_pool.CpuPool`
+once inline and once with worker processes while a timer coroutine records
+how late the loop wakes up, i.e. the delay every other request would see.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.fingerprint_matching import build_page  # noqa: E402
+from services.martech.cpu_pool import CpuPool, LoopLagMonitor  # noqa: E402
+from services.shared.fingerprint import (  # noqa: E402
+    DEFAULT_CMS_FINGERPRINTS,
+    DEFAULT_FINGERPRINTS,
+    FingerprintSet,
+)
+
+SETS = [
+    FingerprintSet("vendors", DEFAULT_FINGERPRINTS),
+    FingerprintSet("cms", DEFAULT_CMS_FINGERPRINTS, include_scripts=False),
+]
+
+
+async def measure(pool: CpuPool, pages: int, size_kb: int) -> None:
+    html, urls, bodies = build_page(size_kb)
+    args = (html, "https://example.com/", {}, {}, urls, bodies)
+    # Start workers and warm caches outside the measurement.
+    await pool.parse(html, SETS)
+    await pool.detect(args, SETS)
+
+    monitor = LoopLagMonitor(interval=0.005)
+    monitor.start()
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for _ in range(pages):
+        await pool.parse(html, SETS)
+        await pool.detect(args, SETS)
+        # Let the timer run between pages, as it would between requests.
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.02)
+    monitor.stop()
+    stats = monitor.stats()
+    mode = "workers" if pool.workers else "inline"
+    print(
+        f"{mode} pages={pages} html_bytes={len(html)} "
+        f"per_page_ms={elapsed / pages * 1000:.1f} "
+        f"lag_mean_ms={stats['mean_ms']:.1f} lag_max_ms={stats['max_ms']:.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--size-kb", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    for workers in (0, args.workers):
+        pool = CpuPool(workers, min_bytes=0)
+        try:
+            asyncio.run(measure(pool, args.pages, args.size_kb))
+        finally:
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Measure per-page fingerprint matching cost.
+
+Run from the repository root::
+
+    python benchmarks/fingerprint_matching.py --pages 200
+
+A synthetic page is built from a realistic mix of markup, inline scripts and
+third-party resource URLs, then matched against both ``fingerprints.yaml`` and
+``cms_fingerprints.yaml`` the same way ``/analyze`` does.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from services.shared.fingerprint import (  # noqa: E402
+    DEFAULT_CMS_FINGERPRINTS,
+    DEFAULT_FINGERPRINTS,
+    FingerprintSet,
+    PageModel,
+    detect_all,
+    match_fingerprints,
+)
+
+HOSTS = [
+    "www.googletagmanager.com",
+    "connect.facebook.net",
+    "cdn.segment.com",
+    "static.hotjar.com",
+    "js.hs-analytics.net",
+    "assets.adobedtm.com",
+    "cdn.shopify.com",
+    "fonts.googleapis.com",
+    "cdn.jsdelivr.net",
+    "static.example-cdn.net",
+]
+
+
+def build_page(size_kb: int = 256, n_urls: int = 60) -> tuple[str, list[str], list[str]]:
+    """Return ``(html, resource_urls, script_bodies)`` for a synthetic page."""
+    block = (
+        "<div class='card'><h2>Product</h2><p>Lorem ipsum dolor sit amet, "
+        "consectetur adipiscing elit.</p><a href='/p/123'>Buy</a></div>\n"
+    )
+    html = block * (size_kb * 1024 // len(block))
+    html += "<script>window.dataLayer = window.dataLayer || [];gtag('js', new Date());</script>"
+    urls = [
+        f"https://{HOSTS[i % len(HOSTS)]}/static/{i}/bundle.min.js?v={i}"
+        for i in range(n_urls)
+    ]
+    bodies = [
+        "!function(){var e=window;" + "e.q=e.q||[];" * 2000 + "}();",
+        "analytics.load('KEY');" + "function n(t){return t}" * 1500,
+    ]
+    return html, urls, bodies
+
+
+def run(pages: int, size_kb: int, n_urls: int) -> None:
+    html, urls, bodies = build_page(size_kb, n_urls)
+    headers = {"server": "nginx", "content-type": "text/html"}
+    cookies = {"_ga": "GA1.2.3", "sessionid": "abc"}
+    page_html = "\n".join([html, *bodies])
+
+    # Warm up so one-off loading cost is not attributed to matching.
+    match_fingerprints(page_html, "", {}, cookies, urls, DEFAULT_FINGERPRINTS)
+    match_fingerprints(
+        html, "https://example.com/", headers, cookies, urls, DEFAULT_CMS_FINGERPRINTS
+    )
+
+    start = time.perf_counter()
+    for _ in range(pages):
+        match_fingerprints(page_html, "", {}, cookies, urls, DEFAULT_FINGERPRINTS)
+        match_fingerprints(
+            html,
+            "https://example.com/",
+            headers,
+            cookies,
+            urls,
+            DEFAULT_CMS_FINGERPRINTS,
+        )
+    elapsed = time.perf_counter() - start
+    print(
+        f"separate pages={pages} html_bytes={len(page_html)} urls={len(urls)} "
+        f"per_page_ms={elapsed / pages * 1000:.3f}"
+    )
+
+    sets = [
+        FingerprintSet("vendors", DEFAULT_FINGERPRINTS),
+        FingerprintSet("cms", DEFAULT_CMS_FINGERPRINTS, include_scripts=False),
+    ]
+    start = time.perf_counter()
+    for _ in range(pages):
+        page = PageModel(html, "https://example.com/", headers, cookies, urls, bodies)
+        detect_all(page, sets)
+    elapsed = time.perf_counter() - start
+    print(
+        f"combined pages={pages} html_bytes={len(page_html)} urls={len(urls)} "
+        f"per_page_ms={elapsed / pages * 1000:.3f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--urls", type=int, default=60)
+    args = parser.parse_args()
+    run(args.pages, args.size_kb, args.urls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Measure HTML parsing cost per fetched page.
+
+Run from the repository root::
+
+    python benchmarks/html_parsing.py --size-kb 512
+
+``legacy`` reproduces the previous request path, which built a full
+BeautifulSoup tree for script extraction, vendor detection and resource hint
+collection separately. ``bs4`` and ``fast`` are single :func:`parse_document`
+calls using the BeautifulSoup and streaming tokenizer backends.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from services.shared.document import parse_document  # noqa: E402
+
+
+def build_html(size_kb: int) -> str:
+    """Return a synthetic page of roughly ``size_kb`` kilobytes."""
+    head = (
+        "<html><head>"
+        "<link rel='preconnect' href='https://fonts.gstatic.com'>"
+        "<link rel='dns-prefetch' href='//cdn.segment.com'>"
+        "<link rel='stylesheet' href='/site.css'>"
+        "<script src='https://www.googletagmanager.com/gtm.js?id=GTM-1'></script>"
+        "<script>window.dataLayer = window.dataLayer || [];</script>"
+        "</head><body>"
+    )
+    block = (
+        "<div class='tile'><a href='/p/1'><img src='/img/1.jpg' alt='x'></a>"
+        "<picture><source srcset='/img/1.webp 1x, /img/1@2x.webp 2x'></picture>"
+        "<p>Lorem ipsum dolor sit amet, <b>consectetur</b> adipiscing.</p>"
+        "<ul><li>One</li><li>Two</li><li>Three</li></ul></div>\n"
+    )
+    body = block * (size_kb * 1024 // len(block))
+    tail = "<script src='/app.js'></script></body></html>"
+    return head + body + tail
+
+
+def legacy(html: str) -> None:
+    from bs4 import BeautifulSoup
+
+    for _ in range(3):
+        soup = BeautifulSoup(html, "html.parser")
+        soup.find_all("script")
+        soup.find_all("link")
+        soup.find_all("img")
+        soup.find_all("source")
+
+
+def bs4(html: str) -> None:
+    parse_document(html, "bs4")
+
+
+def fast(html: str) -> None:
+    parse_document(html, "fast")
+
+
+def run(size_kb: int, rounds: int) -> None:
+    html = build_html(size_kb)
+    for fn in (legacy, bs4, fast):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn(html)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{fn.__name__} html_bytes={len(html)} "
+            f"per_page_ms={elapsed / rounds * 1000:.1f} "
+            f"mb_per_s={len(html) * rounds / elapsed / 1e6:.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    run(args.size_kb, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
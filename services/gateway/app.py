@@ -4,8 +4,9 @@ import time
 import logging
 import json
 from urllib.parse import urlparse
-from typing import Any
+from typing import Any, AsyncIterator, Awaitable, Callable
 
+from services.shared.batch import NDJSON_MEDIA_TYPE, map_unordered, ndjson_line
 from services.shared.utils import normalize_url
 from prometheus_client import Histogram, generate_latest, CONTENT_TYPE_LATEST
 from utils.logging import redact
@@ -17,7 +18,7 @@ from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from services.shared import SecurityHeadersMiddleware
 from pydantic import BaseModel, model_validator
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
 
 @asynccontextmanager
@@ -50,6 +51,13 @@ MARTECH_URL = os.getenv("MARTECH_URL", "http://martech:8000")
 PROPERTY_URL = os.getenv("PROPERTY_URL", "http://property:8000")
 INSIGHT_URL = os.getenv("INSIGHT_URL", "http://insight:8000")
 INSIGHT_TIMEOUT = int(os.getenv("INSIGHT_TIMEOUT", "30"))
+# Batch analysis: concurrent property lookups and the longest wait for the
+# next line of a martech batch stream.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_READ_TIMEOUT = float(os.getenv("BATCH_READ_TIMEOUT", "120"))
+# Largest number of URLs sent to martech per batch call; keep it at or below
+# the martech MAX_BATCH_URLS.
+MARTECH_BATCH_SIZE = int(os.getenv("MARTECH_BATCH_SIZE", "1000"))
 
 # Prometheus histogram for insight requests
 insight_call_duration = Histogram(
@@ -101,6 +109,13 @@ class AnalyzeRequest(BaseModel):
         return values
 
 
+class BatchAnalyzeRequest(BaseModel):
+    urls: list[str]
+    debug: bool | None = False
+    headless: bool | None = False
+    force: bool | None = False
+
+
 class MartechItem(BaseModel):
     category: str
     vendor: str
@@ -303,6 +318,211 @@ async def analyze(req: AnalyzeRequest) -> JSONResponse:
     return JSONResponse(result)
 
 
+async def _martech_lines(path: str, body: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+    """Yield the NDJSON lines of a streamed martech call to ``path``."""
+    timeout = httpx.Timeout(5, read=BATCH_READ_TIMEOUT)
+    start = time.perf_counter()
+    async with app.state.client.stream(
+        "POST", f"{MARTECH_URL}{path}", json=body, timeout=timeout
+    ) as resp:
+        if resp.status_code != 200:
+            record_failure("martech", resp.status_code)
+            raise HTTPException(status_code=502, detail="martech service unavailable")
+        async for raw in resp.aiter_lines():
+            if raw.strip():
+                yield json.loads(raw)
+    record_success("martech", time.perf_counter() - start, resp.status_code)
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(req: AnalyzeRequest) -> StreamingResponse:
+    """Stream the ``/analyze`` sections as NDJSON lines as each becomes ready.
+
+    A ``property`` line is sent once the property lookup returns, and a
+    ``martech`` and a ``cms`` line for each martech tier (``"tier": "fast"``,
+    then ``"deep"``). A final ``done`` line carries the overall ``degraded``
+    flag. Failed sections carry an ``error`` instead of their data.
+    """
+    clean_url = normalize_url(req.url)
+    domain = urlparse(clean_url).hostname
+    if not domain:
+        raise HTTPException(status_code=400, detail="Invalid URL")
+    body = {
+        "url": clean_url,
+        "debug": req.debug,
+        "headless": req.headless,
+        "force": req.force,
+    }
+    queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+    degraded: list[bool] = []
+
+    async def property_section() -> None:
+        line: dict[str, Any] = {"section": "property"}
+        try:
+            line["property"], unavailable = await _post_with_retry(
+                f"{PROPERTY_URL}/analyze", {"domain": domain}, "property"
+            )
+        except HTTPException as exc:
+            line.update(property=None, error=str(exc.detail))
+            unavailable = True
+        degraded.append(unavailable)
+        await queue.put(line)
+
+    async def martech_sections() -> None:
+        try:
+            async for item in _martech_lines("/analyze/stream", body):
+                tier = item.get("tier", "deep")
+                martech_data = item.get("result")
+                if martech_data is None:
+                    degraded.append(True)
+                    error = item.get("error", "martech service unavailable")
+                    await queue.put({"section": "martech", "tier": tier, "error": error})
+                    continue
+                cms_list = martech_data.pop("cms", [])
+                await queue.put({"section": "martech", "tier": tier, "martech": martech_data})
+                await queue.put({"section": "cms", "tier": tier, "cms": cms_list})
+        except HTTPException as exc:
+            degraded.append(True)
+            await queue.put({"section": "martech", "error": str(exc.detail)})
+        except (httpx.HTTPError, ValueError):
+            record_failure("martech")
+            degraded.append(True)
+            await queue.put({"section": "martech", "error": "martech service unavailable"})
+
+    async def run(section: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await section()
+        finally:
+            await queue.put(None)
+
+    async def lines() -> AsyncIterator[str]:
+        tasks = [
+            asyncio.create_task(run(property_section)),
+            asyncio.create_task(run(martech_sections)),
+        ]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                line = await queue.get()
+                if line is None:
+                    remaining -= 1
+                else:
+                    yield ndjson_line(line)
+            yield ndjson_line({"section": "done", "degraded": any(degraded)})
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(req: BatchAnalyzeRequest) -> StreamingResponse:
+    """Analyse many URLs, streaming one NDJSON line per URL as it completes.
+
+    Martech results come from streamed martech batch calls of at most
+    ``MARTECH_BATCH_SIZE`` URLs and are merged with property lookups, which run concurrently and once per domain.
+    Each line carries the request position as ``index`` and the same fields
+    as ``/analyze``, or an ``error``.
+    """
+    targets: list[tuple[int, str, str]] = []
+    invalid: list[dict[str, Any]] = []
+    for index, url in enumerate(req.urls):
+        clean_url = normalize_url(url)
+        domain = urlparse(clean_url).hostname
+        if domain:
+            targets.append((index, clean_url, domain))
+        else:
+            invalid.append({"index": index, "url": url, "error": "Invalid URL"})
+
+    property_results: dict[str, asyncio.Future[Any]] = {}
+
+    async def lookup(domain: str) -> tuple[dict[str, Any] | None, bool]:
+        return await _post_with_retry(
+            f"{PROPERTY_URL}/analyze", {"domain": domain}, "property"
+        )
+
+    async def merge(
+        target: tuple[int, str, str], item: dict[str, Any]
+    ) -> dict[str, Any]:
+        index, url, domain = target
+        line: dict[str, Any] = {"index": index, "url": url}
+        try:
+            property_data, property_degraded = await property_results[domain]
+        except Exception as exc:  # noqa: BLE001
+            property_data, property_degraded = None, True
+            line["property_error"] = getattr(exc, "detail", "property service unavailable")
+        martech_data = item.get("result")
+        if martech_data is None:
+            line["error"] = item.get("error", "martech service unavailable")
+            martech_data = {}
+        cms_list = martech_data.pop("cms", [])
+        line.update(
+            {
+                "property": property_data,
+                "martech": martech_data,
+                "cms": cms_list,
+                "degraded": property_degraded or "error" in line,
+            }
+        )
+        return line
+
+    async def lines() -> AsyncIterator[str]:
+        for line in invalid:
+            yield ndjson_line(line)
+        loop = asyncio.get_running_loop()
+        for domain in {domain for _, _, domain in targets}:
+            property_results[domain] = loop.create_future()
+
+        async def fill_properties() -> None:
+            domains = list(property_results)
+            async for _, domain, result in map_unordered(
+                domains, lookup, BATCH_CONCURRENCY
+            ):
+                if isinstance(result, BaseException):
+                    property_results[domain].set_exception(result)
+                else:
+                    property_results[domain].set_result(result)
+
+        filler = asyncio.create_task(fill_properties())
+        try:
+            # Martech accepts a bounded number of URLs per call, so the
+            # targets are streamed through it in chunks, one after another.
+            size = max(MARTECH_BATCH_SIZE, 1)
+            for start in range(0, len(targets), size):
+                chunk = targets[start:start + size]
+                seen: set[int] = set()
+                martech_error: str | None = None
+                try:
+                    async for item in _martech_lines(
+                        "/analyze/batch",
+                        {
+                            "urls": [url for _, url, _ in chunk],
+                            "debug": req.debug,
+                            "headless": req.headless,
+                            "force": req.force,
+                        },
+                    ):
+                        position = item.get("index")
+                        if not isinstance(position, int) or not 0 <= position < len(chunk):
+                            continue
+                        seen.add(position)
+                        yield ndjson_line(await merge(chunk[position], item))
+                except HTTPException as exc:
+                    martech_error = str(exc.detail)
+                except (httpx.HTTPError, ValueError):
+                    record_failure("martech")
+                    martech_error = "martech service unavailable"
+                for position, target in enumerate(chunk):
+                    if position not in seen:
+                        item = {"error": martech_error or "martech service unavailable"}
+                        yield ndjson_line(await merge(target, item))
+        finally:
+            filler.cancel()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
 @app.post("/generate")
 async def generate(req: GenerateRequest) -> JSONResponse:
     clean_url = normalize_url(req.url)
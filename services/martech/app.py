@@ -1,31 +1,44 @@
 from __future__ import annotations
 
 import os
+import re
 import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Iterator
+from urllib.parse import urlparse
 import io
 import asyncio
 import logging
 
 import httpx
-from bs4 import BeautifulSoup
 from fastapi import FastAPI, HTTPException
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from services.shared import SecurityHeadersMiddleware
 from pydantic import BaseModel
-from starlette.responses import JSONResponse
-from services.shared.utils import detect_vendors
+from starlette.responses import JSONResponse, StreamingResponse
+from services.shared.batch import NDJSON_MEDIA_TYPE, ndjson_line
+from services.shared.utils import detect_vendors, normalize_url
+from services.shared.document import PageDocument, parse_document
+from services.martech.backoff import HostBackoff, host_of
+from services.martech.cache import AnalysisCache, SQLiteBackend, SingleFlight
+from services.martech.browser import BrowserPool
+from services.martech.cpu_pool import CpuPool, LoopLagMonitor
+from services.martech.jobs import JobRunner, JobStore
+from services.martech.pipeline import Pipeline, Stage, StageMetrics
+from services.martech.script_cache import ScriptCache, ScriptTooLarge, read_text
 from services.shared.fingerprint import (
     DEFAULT_CMS_FINGERPRINTS,
     DEFAULT_FINGERPRINTS,
+    FingerprintSet,
+    compile_fingerprints,
     load_fingerprints,
-    match_fingerprints,
+    script_match_stats,
 )
 
 # Default path for fingerprint definitions
-CACHE_TTL = 15 * 60  # 15 minutes
+CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(15 * 60)))  # 15 minutes
 BASE_DIR = Path(__file__).resolve().parents[2]
 FINGERPRINT_PATH = BASE_DIR / "fingerprints.yaml"
 CMS_FINGERPRINT_PATH = BASE_DIR / "cms_fingerprints.yaml"
@@ -48,9 +61,22 @@ ENABLE_WAPPALYZER = os.getenv("ENABLE_WAPPALYZER", "0").lower() in {
 async def lifespan(app: FastAPI):
     await _startup()
     app.state.client = httpx.AsyncClient(timeout=10)
+    purger = asyncio.create_task(_purge_cache())
+    loop_lag.start()
+    job_runner.start()
+    if HEADLESS_CONTEXTS > 0:
+        try:
+            await browser_pool.start(_outbound_proxy())
+        except Exception:  # noqa: BLE001
+            logging.exception("headless browser pool unavailable")
     try:
         yield
     finally:
+        purger.cancel()
+        loop_lag.stop()
+        await job_runner.stop()
+        cpu_pool.shutdown()
+        await browser_pool.stop()
         await app.state.client.aclose()
 
 
@@ -78,7 +104,116 @@ try:
     cms_fingerprints: dict[str, Any] | None = load_fingerprints(CMS_FINGERPRINT_PATH)
 except Exception:
     cms_fingerprints = DEFAULT_CMS_FINGERPRINTS or {}
-cache: dict[str, dict[str, Any]] = {}
+
+# Analysis results, bounded by count and approximate size.
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1000"))
+ANALYSIS_CACHE_MAX_BYTES = int(
+    os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+ANALYSIS_CACHE_PURGE_INTERVAL = float(
+    os.getenv("ANALYSIS_CACHE_PURGE_INTERVAL", "60")
+)
+# Expired results are served for this many seconds more while they are
+# refreshed in the background; 0 disables stale serving.
+ANALYSIS_CACHE_STALE_TTL = float(os.getenv("ANALYSIS_CACHE_STALE_TTL", "0"))
+ANALYSIS_REFRESH_CONCURRENCY = int(os.getenv("ANALYSIS_REFRESH_CONCURRENCY", "4"))
+# Optional SQLite file shared by all workers on a host and kept across
+# restarts; the in-memory cache stays in front of it.
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH")
+_cache_backend: SQLiteBackend | None = None
+if ANALYSIS_CACHE_PATH:
+    try:
+        _cache_backend = SQLiteBackend(ANALYSIS_CACHE_PATH)
+    except Exception:  # noqa: BLE001
+        logging.exception("failed to open analysis cache database")
+cache = AnalysisCache(
+    CACHE_TTL,
+    ANALYSIS_CACHE_MAX_ENTRIES,
+    ANALYSIS_CACHE_MAX_BYTES,
+    stale_ttl=ANALYSIS_CACHE_STALE_TTL,
+    backend=_cache_backend,
+)
+# Concurrent requests for the same key share one analysis.
+inflight = SingleFlight()
+_refreshes: set[asyncio.Task[Any]] = set()
+# Deep tiers still running after their fast tier was returned.
+_deep_analyses: set[asyncio.Task[Any]] = set()
+# Flights an abandoned batch had started, finished for the callers joined.
+_handoffs: set[asyncio.Task[Any]] = set()
+
+# Hosts whose pages failed to load are skipped for a delay that depends on the
+# error class and doubles with each consecutive failure. Failed results are
+# cached for the same delay.
+NEGATIVE_CACHE_TIMEOUT_TTL = float(os.getenv("NEGATIVE_CACHE_TIMEOUT_TTL", "60"))
+NEGATIVE_CACHE_CONNECT_TTL = float(os.getenv("NEGATIVE_CACHE_CONNECT_TTL", "300"))
+NEGATIVE_CACHE_OTHER_TTL = float(os.getenv("NEGATIVE_CACHE_OTHER_TTL", "120"))
+NEGATIVE_CACHE_MAX_TTL = float(os.getenv("NEGATIVE_CACHE_MAX_TTL", "3600"))
+host_backoff = HostBackoff(
+    {
+        "timeout": NEGATIVE_CACHE_TIMEOUT_TTL,
+        "connect": NEGATIVE_CACHE_CONNECT_TTL,
+        "other": NEGATIVE_CACHE_OTHER_TTL,
+    },
+    max_delay=NEGATIVE_CACHE_MAX_TTL,
+)
+refresh_stats = {"started": 0, "skipped": 0, "failed": 0}
+
+# Limits for fetching a page's external scripts.
+SCRIPT_FETCH_CONCURRENCY = int(os.getenv("SCRIPT_FETCH_CONCURRENCY", "8"))
+MAX_SCRIPTS_PER_PAGE = int(os.getenv("MAX_SCRIPTS_PER_PAGE", "50"))
+MAX_SCRIPT_BYTES_PER_PAGE = int(
+    os.getenv("MAX_SCRIPT_BYTES_PER_PAGE", str(5 * 1024 * 1024))
+)
+
+# Third-party script bodies are shared across analysed sites.
+SCRIPT_CACHE_MAX_BYTES = int(
+    os.getenv("SCRIPT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+script_cache = ScriptCache(SCRIPT_CACHE_MAX_BYTES)
+
+# Largest number of URLs accepted per batch request.
+MAX_BATCH_URLS = int(os.getenv("MAX_BATCH_URLS", "1000"))
+
+# Pages of at least CPU_OFFLOAD_MIN_BYTES are parsed and matched in
+# CPU_WORKERS worker processes so they do not stall the event loop; 0 keeps
+# all work inline.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+CPU_OFFLOAD_MIN_BYTES = int(os.getenv("CPU_OFFLOAD_MIN_BYTES", str(512 * 1024)))
+cpu_pool = CpuPool(CPU_WORKERS, CPU_OFFLOAD_MIN_BYTES)
+loop_lag = LoopLagMonitor(float(os.getenv("LOOP_LAG_INTERVAL", "0.1")))
+
+# Headless analyses share one Firefox with at most HEADLESS_CONTEXTS contexts,
+# each replaced after HEADLESS_PAGES_PER_CONTEXT pages. Requests wait up to
+# HEADLESS_QUEUE_TIMEOUT seconds for a free context; 0 contexts launches a
+# browser per request instead.
+HEADLESS_CONTEXTS = int(os.getenv("HEADLESS_CONTEXTS", "2"))
+HEADLESS_PAGES_PER_CONTEXT = int(os.getenv("HEADLESS_PAGES_PER_CONTEXT", "50"))
+HEADLESS_QUEUE_TIMEOUT = float(os.getenv("HEADLESS_QUEUE_TIMEOUT", "10"))
+browser_pool = BrowserPool(
+    HEADLESS_CONTEXTS, HEADLESS_PAGES_PER_CONTEXT, HEADLESS_QUEUE_TIMEOUT
+)
+# Resource URLs captured by headless runs are cached apart from analysis
+# results and for longer, so forced re-analyses reuse a recent render and
+# only fetch the static page again.
+HEADLESS_CACHE_TTL = float(os.getenv("HEADLESS_CACHE_TTL", str(6 * 60 * 60)))
+HEADLESS_CACHE_MAX_ENTRIES = int(os.getenv("HEADLESS_CACHE_MAX_ENTRIES", "1000"))
+HEADLESS_CACHE_MAX_BYTES = int(
+    os.getenv("HEADLESS_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+)
+render_cache = AnalysisCache(
+    HEADLESS_CACHE_TTL, HEADLESS_CACHE_MAX_ENTRIES, HEADLESS_CACHE_MAX_BYTES
+)
+renders = SingleFlight()
+
+# Bulk jobs and their progress are stored in SQLite under MARTECH_DATA_DIR so
+# they survive restarts; tests set JOBS_DB_PATH=:memory:.
+MARTECH_DATA_DIR = Path(os.getenv("MARTECH_DATA_DIR", str(BASE_DIR / "data")))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", str(MARTECH_DATA_DIR / "jobs.db"))
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "8"))
+MAX_JOB_URLS = int(os.getenv("MAX_JOB_URLS", "100000"))
+# A worker renews its running jobs every third of the lease; jobs not renewed
+# for a whole lease are taken over by another worker sharing the store.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
 
 # URL of the insight service used for persona generation
 INSIGHT_URL = os.getenv("INSIGHT_URL", "http://insight:8000")
@@ -89,6 +224,20 @@ class AnalyzeRequest(BaseModel):
     debug: bool | None = False
     headless: bool | None = False
     force: bool | None = False
+    tiered: bool | None = False
+
+
+class BatchAnalyzeRequest(BaseModel):
+    urls: list[str]
+    debug: bool | None = False
+    headless: bool | None = False
+    force: bool | None = False
+
+
+class JobRequest(BaseModel):
+    urls: list[str]
+    headless: bool | None = False
+    force: bool | None = False
 
 
 class DiagnoseResponse(BaseModel):
@@ -128,58 +277,176 @@ def _log_manual_cms(value: str) -> None:
 
 
 async def _fetch(
-    client: httpx.AsyncClient, url: str
+    client: httpx.AsyncClient, url: str, max_chars: int | None = None
 ) -> tuple[str, dict[str, str], dict[str, str]]:
-    r = await client.get(url, follow_redirects=True)
-    r.raise_for_status()
+    """Return body, headers and cookies of ``url``.
+
+    With ``max_chars`` the body is streamed and the download abandoned with
+    :class:`ScriptTooLarge` once it grows past that many characters.
+    """
+    if max_chars is None:
+        r = await client.get(url, follow_redirects=True)
+        r.raise_for_status()
+        text = r.text
+    else:
+        async with client.stream("GET", url, follow_redirects=True) as r:
+            r.raise_for_status()
+            text = await read_text(r, max_chars)
     cookies = {k: v for k, v in r.cookies.items()}
     headers = {k.lower(): v for k, v in r.headers.items()}
-    return r.text, headers, cookies
+    return text, headers, cookies
 
 
 async def _extract_scripts(
     client: httpx.AsyncClient | None,
-    html: str,
+    html: str | PageDocument,
     base_url: str | None = None,
 ) -> tuple[set[str], list[str], list[str]]:
-    soup = BeautifulSoup(html, "html.parser")
-    urls: set[str] = set()
-    inline: list[str] = []
+    """Return script URLs, inline scripts and external script bodies.
+
+    External scripts are deduplicated by resolved URL and fetched
+    concurrently through ``script_cache``, at most ``SCRIPT_FETCH_CONCURRENCY``
+    at a time and in page order. Only the first ``MAX_SCRIPTS_PER_PAGE``
+    unique scripts are considered. Bodies are kept in page order while they
+    fit in ``MAX_SCRIPT_BYTES_PER_PAGE``; a body that does not fit is left
+    out, and no further fetch starts once the kept bodies use the whole
+    budget. Failed fetches contribute an empty body. GTM containers are
+    always fetched, up to the whole budget, so the URLs they load are found
+    even when their body is not kept.
+    """
+    doc = html if isinstance(html, PageDocument) else parse_document(html)
+    urls: set[str] = set(doc.script_srcs)
+    inline: list[str] = list(doc.inline_scripts)
     external: list[str] = []
+    if client is None:
+        return urls, inline, external
     from urllib.parse import urljoin
 
-    for tag in soup.find_all("script"):
-        src = tag.get("src")
-        if src:
-            urls.add(src)
-            if client is not None:
-                try:
-                    if src.startswith("http"):
-                        full_src = src
-                    else:
-                        full_src = urljoin(base_url or "", src)
-                    script_text, _, _ = await _fetch(client, full_src)
-                    external.append(script_text)
-                    if "googletagmanager.com/gtm.js" in src:
-                        import re
-
-                        matches = re.findall(r"https?://[^\"']+\.js", script_text)
-                        urls.update(matches)
-                except Exception:
-                    external.append("")
-        else:
-            text = tag.string
-            if text:
-                inline.append(text)
+    targets: dict[str, str] = {}
+    for src in doc.script_srcs:
+        full_src = src if src.startswith("http") else urljoin(base_url or "", src)
+        if full_src in targets:
+            continue
+        if len(targets) >= MAX_SCRIPTS_PER_PAGE:
+            break
+        targets[full_src] = src
+
+    # The budget is applied in page order so the same page always keeps the
+    # same bodies. ``remaining`` is what is left after the settled prefix of
+    # the page; it only shrinks, so a fetch capped at its value when the fetch
+    # starts is never cut short for a body the page order would keep.
+    # Characters approximate bytes closely for script bodies.
+    order = list(targets.items())
+    done: dict[int, str | None] = {}
+    settled = 0
+    remaining = MAX_SCRIPT_BYTES_PER_PAGE
+
+    def is_gtm(src: str) -> bool:
+        return "googletagmanager.com/gtm.js" in src
+
+    def settle() -> None:
+        nonlocal settled, remaining
+        while settled in done:
+            script_text = done.pop(settled)
+            src = order[settled][1]
+            settled += 1
+            if script_text is None:
+                continue
+            if is_gtm(src):
+                urls.update(re.findall(r"https?://[^\"']+\.js", script_text))
+            if remaining > 0 and len(script_text) <= remaining:
+                remaining -= len(script_text)
+                external.append(script_text)
+
+    semaphore = asyncio.Semaphore(max(1, SCRIPT_FETCH_CONCURRENCY))
+
+    async def fetch_one(index: int, full_src: str, limit: int) -> None:
+        try:
+            done[index] = await script_cache.fetch(
+                client,
+                full_src,
+                lambda c, u: _fetch(c, u, max_chars=limit),
+                limit,
+            )
+        except ScriptTooLarge:
+            done[index] = None
+        except Exception:
+            done[index] = ""
+        finally:
+            semaphore.release()
+        settle()
+
+    tasks: list[asyncio.Task[None]] = []
+    try:
+        for index, (full_src, src) in enumerate(order):
+            await semaphore.acquire()
+            if is_gtm(src):
+                limit = MAX_SCRIPT_BYTES_PER_PAGE
+            elif remaining > 0:
+                limit = remaining
+            else:
+                # Only GTM containers can still contribute.
+                semaphore.release()
+                done[index] = None
+                settle()
+                continue
+            tasks.append(asyncio.create_task(fetch_one(index, full_src, limit)))
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
     return urls, inline, external
 
 
-async def _headless_request(url: str, proxy: str | None = None) -> str:
-    """Fetch ``url`` using Playwright with JavaScript disabled."""
+# Requests of these types are recorded but never downloaded in headless runs.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+
+
+async def _capture_requests(page: Any, url: str) -> set[str]:
+    """Load ``url`` in ``page`` and return the URLs of the requests it made.
+
+    Images, fonts, media and stylesheets are aborted after their URL is
+    recorded since only the URL matters to the matcher.
+    """
+    captured: set[str] = set()
+
+    async def handle(route: Any) -> None:
+        request = route.request
+        if not (
+            request.is_navigation_request() and request.frame == page.main_frame
+        ):
+            captured.add(request.url)
+        if request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await page.route("**/*", handle)
+    await page.goto(url, wait_until="load", timeout=5000)
+    return captured
+
+
+async def _headless_request(url: str, proxy: str | None = None) -> set[str] | None:
+    """Load ``url`` using Playwright with JavaScript disabled.
+
+    Returns the resource URLs requested by the page, or ``None`` if it could
+    not be rendered. The shared browser pool is used when it runs with the
+    same proxy; otherwise a browser is launched for this request alone.
+    """
+    if browser_pool.running and browser_pool.proxy == proxy:
+        try:
+            async with browser_pool.page() as page:
+                return await _capture_requests(page, url)
+        except asyncio.TimeoutError:
+            logging.warning("no headless browser context free for %s", url)
+            return None
+        except Exception:
+            return None
+
     try:
         from playwright.async_api import async_playwright
     except Exception:
-        return ""
+        return None
 
     try:
         async with async_playwright() as pw:
@@ -189,103 +456,148 @@ async def _headless_request(url: str, proxy: str | None = None) -> str:
                 context_opts["proxy"] = {"server": proxy}
             context = await browser.new_context(**context_opts)
             page = await context.new_page()
-            await page.goto(url, wait_until="load", timeout=5000)
-            content = await page.content()
+            captured = await _capture_requests(page, url)
             await browser.close()
-            return content
+            return captured
     except Exception:
-        return ""
-
-
-def _collect_resource_hints(html: str) -> set[str]:
-    """Return URLs from resource hint/link and img tags."""
-    soup = BeautifulSoup(html, "html.parser")
-    urls: set[str] = set()
-    for tag in soup.find_all("link"):
-        rel = tag.get("rel", [])
-        if isinstance(rel, str):
-            rel = [rel]
-        if any(r in {"preconnect", "dns-prefetch"} for r in rel):
-            href = tag.get("href")
-            if href:
-                urls.add(href)
-    for tag in soup.find_all("img"):
-        src = tag.get("src")
-        if src:
-            urls.add(src)
-    for tag in soup.find_all("source"):
-        srcset = tag.get("srcset") or tag.get("src")
-        if srcset:
-            for part in srcset.split(","):
-                val = part.strip().split(" ")[0]
-                if val:
-                    urls.add(val)
-    return urls
+        return None
 
 
-async def analyze_url(
-    url: str, debug: bool = False, headless: bool = False
-) -> dict[str, object]:
-    proxy = (
+def _render_key(url: str, proxy: str | None) -> str:
+    """Return the render cache key for ``url`` and the browser options."""
+    query = urlparse(url.strip()).query
+    parts = [
+        normalize_url(url) + (f"?{query}" if query else ""),
+        proxy or "direct",
+        "js=off",
+        "block=" + ",".join(sorted(BLOCKED_RESOURCE_TYPES)),
+    ]
+    return "|".join(parts)
+
+
+async def _headless_resources(url: str, proxy: str | None = None) -> set[str]:
+    """Return the resource URLs requested by ``url``, reusing recent renders."""
+    key = _render_key(url, proxy)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return set(cached["urls"])
+
+    async def render() -> set[str]:
+        urls = await _headless_request(url, proxy)
+        if urls is None:
+            return set()
+        render_cache.set(key, {"urls": sorted(urls)})
+        return urls
+
+    return await renders.run(key, render)
+
+
+def _outbound_proxy() -> str | None:
+    return (
         os.getenv("OUTBOUND_HTTP_PROXY")
         or os.getenv("HTTP_PROXY")
         or os.getenv("HTTPS_PROXY")
         or None
     )
-    network_error = False
-    script_urls: set[str]
-    inline: list[str]
-    external: list[str]
-    client = getattr(app.state, "client", None)
-    close_client = False
-    if client is None:
-        client = httpx.AsyncClient(timeout=10, proxy=proxy)
-        close_client = True
+
+
+@dataclass
+class PageAnalysis:
+    """State of one URL as it moves through the analysis stages."""
+
+    url: str
+    debug: bool = False
+    headless: bool = False
+    network_error: bool = False
+    html: str = ""
+    headers: dict[str, str] = field(default_factory=dict)
+    cookies: dict[str, str] = field(default_factory=dict)
+    document: PageDocument | None = None
+    script_urls: set[str] = field(default_factory=set)
+    inline: list[str] = field(default_factory=list)
+    external: list[str] = field(default_factory=list)
+    resource_urls: set[str] = field(default_factory=set)
+
+
+async def _fetch_stage(client: httpx.AsyncClient, state: PageAnalysis) -> PageAnalysis:
+    """Download the page unless its host is backed off."""
+    url = state.url
+    host = host_of(url)
+    backoff_error = host_backoff.blocked(host)
+    if backoff_error is not None:
+        logging.info("skipping %s, backing off after %s errors", url, backoff_error)
+        state.network_error = True
+        return state
     try:
-        html, resp_headers, resp_cookies = await _fetch(client, url)
+        state.html, state.headers, state.cookies = await _fetch(client, url)
     except (
         httpx.RequestError,
         asyncio.TimeoutError,
-    ):  # noqa: BLE001
+    ) as exc:  # noqa: BLE001
         logging.exception("failed fetching %s", url)
-        network_error = True
-        html = ""
-        resp_headers = {}
-        resp_cookies = {}
-        script_urls, inline, external = set(), [], []
+        host_backoff.failure(host, exc)
+        state.network_error = True
     else:
-        script_urls, inline, external = await _extract_scripts(
-            client, html, base_url=url
+        host_backoff.success(host)
+    return state
+
+
+def _fingerprint_sets() -> list[FingerprintSet]:
+    sets = [
+        FingerprintSet(
+            "vendors",
+            fingerprints if fingerprints is not None else DEFAULT_FINGERPRINTS,
         )
-    if close_client and hasattr(client, "aclose"):
-        await client.aclose()
-
-    resource_urls: set[str] = set()
-    if headless and not network_error:
-        headless_html = await _headless_request(url, proxy)
-        if headless_html:
-            resource_urls.update(_collect_resource_hints(headless_html))
-
-    all_urls = list(script_urls | resource_urls)
-    vendors = detect_vendors(
-        html, resp_cookies, all_urls, fingerprints, script_bodies=external
-    )
-    cms_results: dict[str, Any] = {}
+    ]
     if cms_fingerprints is not None:
-        cms_results = match_fingerprints(
-            html,
-            url,
-            resp_headers,
-            resp_cookies,
-            all_urls,
-            cms_fingerprints,
-        )
+        sets.append(FingerprintSet("cms", cms_fingerprints, include_scripts=False))
+    return sets
+
+
+async def _parse_stage(state: PageAnalysis) -> PageAnalysis:
+    """Parse the fetched body once; later stages read from the document.
+
+    Script sources and resource hints named in the HTML are recorded here so
+    host matchers see them without any further download.
+    """
+    if not state.network_error:
+        state.document = await cpu_pool.parse(state.html, _fingerprint_sets())
+        state.script_urls = set(state.document.script_srcs)
+        state.resource_urls.update(state.document.hint_urls())
+    return state
+
+
+async def _scripts_stage(
+    client: httpx.AsyncClient, state: PageAnalysis, proxy: str | None = None
+) -> PageAnalysis:
+    """Download external scripts and, for headless runs, requested resources."""
+    if state.network_error or state.document is None:
+        return state
+    state.script_urls, state.inline, state.external = await _extract_scripts(
+        client, state.document, base_url=state.url
+    )
+    if state.headless:
+        state.resource_urls.update(await _headless_resources(state.url, proxy))
+    return state
+
+
+async def _match_stage(state: PageAnalysis) -> dict[str, Any]:
+    """Detect vendors and CMS and build the analysis result."""
+    url, html = state.url, state.html
+    all_urls = list(state.script_urls | state.resource_urls)
+    # Vendors and CMS are detected in one pass over a shared page model.
+    detected = await cpu_pool.detect(
+        (html, url, state.headers, state.cookies, all_urls, state.external),
+        _fingerprint_sets(),
+    )
+    vendors = detected["vendors"]
+    cms_results: dict[str, Any] = detected.get("cms", {})
     if ENABLE_WAPPALYZER:
         try:
             from Wappalyzer import Wappalyzer, WebPage
 
-            page = WebPage(url, html, resp_headers)
-            techs = Wappalyzer.latest().analyze(page)
+            webpage = WebPage(url, html, state.headers)
+            techs = Wappalyzer.latest().analyze(webpage)
             for name in techs:
                 exists = any(name in v for v in cms_results.values())
                 if not exists:
@@ -297,17 +609,93 @@ async def analyze_url(
             logging.exception("wappalyzer failed")
     response: dict[str, Any] = vendors
     response["cms"] = cms_results
-    response["network_error"] = network_error
-    if debug:
+    response["network_error"] = state.network_error
+    if state.debug:
         response["debug"] = {
             "scripts": all_urls,
-            "inline_count": len(inline) + len(external),
+            "inline_count": len(state.inline) + len(state.external),
             "html_size": len(html),
-            "cookies": resp_cookies,
+            "cookies": state.cookies,
         }
     return response
 
 
+async def analyze_url(
+    url: str,
+    debug: bool = False,
+    headless: bool = False,
+    on_fast: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, object]:
+    """Analyse ``url`` through all stages.
+
+    ``on_fast`` receives the fast tier, matched on the page HTML, headers and
+    cookies only, before external scripts and headless resources are loaded.
+    """
+    proxy = _outbound_proxy()
+    client = getattr(app.state, "client", None)
+    close_client = False
+    if client is None:
+        client = httpx.AsyncClient(timeout=10, proxy=proxy)
+        close_client = True
+    state = PageAnalysis(url, debug=debug, headless=headless)
+    try:
+        await _fetch_stage(client, state)
+        await _parse_stage(state)
+        if on_fast is not None:
+            on_fast(await _match_stage(state))
+        await _scripts_stage(client, state, proxy)
+    finally:
+        if close_client and hasattr(client, "aclose"):
+            await client.aclose()
+    return await _match_stage(state)
+
+
+# Per-stage worker counts for bulk analysis. Fetch and script stages wait on
+# the network, parse and match use the CPU.
+PIPELINE_FETCH_CONCURRENCY = int(os.getenv("PIPELINE_FETCH_CONCURRENCY", "16"))
+PIPELINE_SCRIPT_CONCURRENCY = int(os.getenv("PIPELINE_SCRIPT_CONCURRENCY", "16"))
+PIPELINE_PARSE_CONCURRENCY = int(os.getenv("PIPELINE_PARSE_CONCURRENCY", "2"))
+PIPELINE_MATCH_CONCURRENCY = int(os.getenv("PIPELINE_MATCH_CONCURRENCY", "2"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+# Shared by every pipeline run so /pipeline/stats covers all of them.
+pipeline_metrics = {
+    name: StageMetrics() for name in ("fetch", "parse", "scripts", "match")
+}
+
+
+def build_pipeline(
+    client: httpx.AsyncClient, proxy: str | None = None
+) -> Pipeline:
+    """Return the fetch → parse → scripts → match pipeline.
+
+    Items are :class:`PageAnalysis` states and results are analysis dicts as
+    returned by :func:`analyze_url`. Parsing runs before the script stage
+    because script URLs come from the parsed document.
+    """
+
+    async def fetch(state: PageAnalysis) -> PageAnalysis:
+        return await _fetch_stage(client, state)
+
+    async def parse(state: PageAnalysis) -> PageAnalysis:
+        return await _parse_stage(state)
+
+    async def scripts(state: PageAnalysis) -> PageAnalysis:
+        return await _scripts_stage(client, state, proxy)
+
+    async def match(state: PageAnalysis) -> dict[str, Any]:
+        return await _match_stage(state)
+
+    stages = [
+        Stage("fetch", fetch, PIPELINE_FETCH_CONCURRENCY, pipeline_metrics["fetch"]),
+        Stage("parse", parse, PIPELINE_PARSE_CONCURRENCY, pipeline_metrics["parse"]),
+        Stage(
+            "scripts", scripts, PIPELINE_SCRIPT_CONCURRENCY, pipeline_metrics["scripts"]
+        ),
+        Stage("match", match, PIPELINE_MATCH_CONCURRENCY, pipeline_metrics["match"]),
+    ]
+    return Pipeline(stages, PIPELINE_QUEUE_SIZE)
+
+
 async def _startup() -> None:
     global fingerprints, cms_fingerprints
     if fingerprints is None:
@@ -320,6 +708,40 @@ async def _startup() -> None:
             cms_fingerprints = _load_fingerprints(CMS_FINGERPRINT_PATH)
         except Exception:
             cms_fingerprints = {}
+    # Compile patterns up front so the first request does not pay for it.
+    try:
+        compile_fingerprints(fingerprints)
+        compile_fingerprints(cms_fingerprints)
+    except Exception:  # noqa: BLE001
+        logging.exception("failed to compile fingerprints")
+
+
+def _cache_key(url: str, headless: bool) -> str:
+    """Return the analysis cache key for ``url`` and the request options.
+
+    The URL is normalised so spelling variants share an entry, while the
+    query string is kept because it can change the page. The fingerprint
+    versions are included so reloaded definitions never serve old results.
+    """
+    query = urlparse(url.strip()).query
+    parts = [
+        normalize_url(url) + (f"?{query}" if query else ""),
+        "headless" if headless else "static",
+        compile_fingerprints(fingerprints or {}).version,
+        compile_fingerprints(cms_fingerprints or {}).version,
+    ]
+    return "|".join(parts)
+
+
+async def _purge_cache() -> None:
+    """Periodically drop expired analysis results."""
+    while True:
+        await asyncio.sleep(ANALYSIS_CACHE_PURGE_INTERVAL)
+        try:
+            cache.purge_expired()
+            render_cache.purge_expired()
+        except Exception:  # noqa: BLE001
+            logging.exception("failed to purge analysis cache")
 
 
 @app.get("/health")
@@ -327,6 +749,54 @@ async def health() -> JSONResponse:
     return JSONResponse({"status": "ok"})
 
 
+@app.get("/cache/stats")
+async def cache_stats() -> JSONResponse:
+    """Return hit/miss counters and sizes of the service caches."""
+    return JSONResponse(
+        {
+            "analysis": cache.stats(),
+            "inflight": inflight.stats(),
+            "headless": {**render_cache.stats(), "inflight": renders.stats()},
+            "refresh": {"running": len(_refreshes), **refresh_stats},
+            "deep": {"running": len(_deep_analyses)},
+            "backoff": host_backoff.stats(),
+            "scripts": script_cache.stats(),
+            "script_matches": script_match_stats(),
+        }
+    )
+
+
+@app.get("/pipeline/stats")
+async def pipeline_stats() -> JSONResponse:
+    """Return throughput and queue depth of the bulk analysis stages."""
+    return JSONResponse(
+        {
+            name: {
+                "concurrency": concurrency,
+                **pipeline_metrics[name].snapshot(),
+            }
+            for name, concurrency in (
+                ("fetch", PIPELINE_FETCH_CONCURRENCY),
+                ("parse", PIPELINE_PARSE_CONCURRENCY),
+                ("scripts", PIPELINE_SCRIPT_CONCURRENCY),
+                ("match", PIPELINE_MATCH_CONCURRENCY),
+            )
+        }
+    )
+
+
+@app.get("/runtime/stats")
+async def runtime_stats() -> JSONResponse:
+    """Return event loop lag and CPU worker pool counters."""
+    return JSONResponse(
+        {
+            "event_loop_lag": loop_lag.stats(),
+            "cpu_pool": cpu_pool.stats(),
+            "browser_pool": browser_pool.stats(),
+        }
+    )
+
+
 @app.get("/ready", response_model=ReadyResponse)
 async def ready() -> ReadyResponse:
     global fingerprints, cms_fingerprints
@@ -345,33 +815,129 @@ async def ready() -> ReadyResponse:
     )
 
 
-@app.post("/analyze")
-async def analyze(req: AnalyzeRequest) -> JSONResponse:
-    if fingerprints is None or cms_fingerprints is None:
-        raise HTTPException(status_code=503, detail="Service not ready")
-    url = req.url
-    now = time.time()
-    entry = cache.get(url)
-    fresh = (
-        entry
-        and isinstance(entry.get("time"), float)
-        and now - entry["time"] < CACHE_TTL
-    )
-    if fresh and entry is not None and not req.force:
-        result = entry["data"]
-    else:
-        try:
-            result = await analyze_url(
-                url, debug=bool(req.debug), headless=bool(req.headless)
+def _store_result(key: str, url: str, data: dict[str, Any]) -> None:
+    if not data.get("network_error"):
+        cache.set(key, data)
+        return
+    # Failures are only cached while the host is backed off.
+    ttl = host_backoff.remaining(host_of(url))
+    if ttl > 0:
+        cache.set(key, data, ttl=ttl)
+
+
+async def _analyze_cached(
+    key: str,
+    url: str,
+    debug: bool,
+    headless: bool,
+    on_fast: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, Any]:
+    """Analyse ``url`` once for all concurrent callers and cache the result.
+
+    ``on_fast`` is only called if this caller starts the analysis.
+    """
+
+    async def run() -> dict[str, Any]:
+        if on_fast is None:
+            data = await analyze_url(url, debug=debug, headless=headless)
+        else:
+            data = await analyze_url(
+                url, debug=debug, headless=headless, on_fast=on_fast
             )
+        _store_result(key, url, data)
+        return data
+
+    return await inflight.run(_flight_key(key, debug), run)
+
+
+def _hand_off(
+    future: asyncio.Future[Any], key: str, url: str, debug: bool, headless: bool
+) -> None:
+    """Finish a claimed flight in the background and resolve ``future``."""
+
+    async def finish() -> None:
+        try:
+            data = await analyze_url(url, debug=debug, headless=headless)
+        except Exception as exc:  # noqa: BLE001
+            logging.error("unexpected error analyzing URL", exc_info=exc)
+            if not future.done():
+                future.set_exception(exc)
+                future.exception()  # joined callers re-raise it
+            return
+        _store_result(key, url, data)
+        if not future.done():
+            future.set_result(data)
+
+    task = asyncio.create_task(finish())
+    _handoffs.add(task)
+    task.add_done_callback(_handoffs.discard)
+
+
+def _flight_key(key: str, debug: bool) -> str:
+    # Debug output is part of the result, so it gets its own flight.
+    return f"{key}|debug" if debug else key
+
+
+async def _analyze_tiered(
+    key: str, url: str, debug: bool, headless: bool
+) -> AsyncGenerator[tuple[str, dict[str, Any]], None]:
+    """Yield ``("fast", result)`` as soon as it is ready, then ``("deep", result)``.
+
+    The deep tier keeps running and is cached even if the caller stops after
+    the fast tier. Joining an analysis already in flight yields only the
+    deep tier.
+    """
+    fast: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+
+    def on_fast(data: dict[str, Any]) -> None:
+        if not fast.done():
+            fast.set_result(data)
+
+    deep = asyncio.create_task(_analyze_cached(key, url, debug, headless, on_fast))
+    _deep_analyses.add(deep)
+    deep.add_done_callback(_deep_done)
+    await asyncio.wait({fast, deep}, return_when=asyncio.FIRST_COMPLETED)
+    if fast.done():
+        yield "fast", fast.result()
+    yield "deep", await deep
+
+
+def _deep_done(task: asyncio.Task[Any]) -> None:
+    _deep_analyses.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("deep analysis failed", exc_info=task.exception())
+
+
+def _schedule_refresh(key: str, url: str, debug: bool, headless: bool) -> None:
+    """Refresh a stale cache entry in the background.
+
+    At most ``ANALYSIS_REFRESH_CONCURRENCY`` refreshes run at once; further
+    stale hits keep being served until a slot frees up.
+    """
+    if len(_refreshes) >= ANALYSIS_REFRESH_CONCURRENCY:
+        refresh_stats["skipped"] += 1
+        return
+
+    async def refresh() -> None:
+        try:
+            await _analyze_cached(key, url, debug, headless)
         except Exception:  # noqa: BLE001
-            logging.exception("unexpected error analyzing URL")
-            raise HTTPException(status_code=500, detail="internal error")
-        cache[url] = {"time": now, "data": result}
+            refresh_stats["failed"] += 1
+            logging.exception("failed to refresh cached analysis")
+
+    refresh_stats["started"] += 1
+    task = asyncio.create_task(refresh())
+    _refreshes.add(task)
+    task.add_done_callback(_refreshes.discard)
 
+
+def _format_result(
+    result: dict[str, Any], debug: bool, stale: bool = False
+) -> dict[str, Any]:
+    """Return the client view of an analysis result."""
     final_result: dict[str, Any]
-    if req.debug:
-        final_result = result
+    if debug:
+        final_result = dict(result)
     else:
         final_result = {"network_error": result.get("network_error", False)}
         for bucket, info in result.items():
@@ -385,7 +951,266 @@ async def analyze(req: AnalyzeRequest) -> JSONResponse:
             else:
                 final_result[bucket] = list(info.keys())
 
-    return JSONResponse(final_result)
+    if stale:
+        final_result["stale"] = True
+    return final_result
+
+
+async def _analyze_request(
+    url: str, debug: bool, headless: bool, force: bool, tiered: bool = False
+) -> dict[str, Any]:
+    """Return the ``/analyze`` response body for ``url``.
+
+    With ``tiered`` the fast tier is returned as soon as it is ready and
+    marked with ``"tier": "fast"``; the deep tier is cached in the background
+    and returned by a later call without ``force``.
+
+    Raises :class:`HTTPException` when the analysis fails unexpectedly.
+    """
+    key = _cache_key(url, headless)
+    found = None if force else cache.lookup(key)
+    stale = False
+    tier = "deep"
+    if found is not None:
+        result, stale = found
+        if stale:
+            _schedule_refresh(key, url, debug, headless)
+    else:
+        try:
+            if tiered:
+                tiers = _analyze_tiered(key, url, debug, headless)
+                try:
+                    tier, result = await tiers.__anext__()
+                finally:
+                    await tiers.aclose()
+            else:
+                result = await _analyze_cached(key, url, debug, headless)
+        except Exception:  # noqa: BLE001
+            logging.exception("unexpected error analyzing URL")
+            raise HTTPException(status_code=500, detail="internal error")
+
+    final_result = _format_result(result, debug, stale)
+    if tiered:
+        final_result["tier"] = tier
+    return final_result
+
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest) -> JSONResponse:
+    if fingerprints is None or cms_fingerprints is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    result = await _analyze_request(
+        req.url, bool(req.debug), bool(req.headless), bool(req.force), bool(req.tiered)
+    )
+    return JSONResponse(result)
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(req: AnalyzeRequest) -> StreamingResponse:
+    """Stream the fast and then the deep tier of an analysis as NDJSON.
+
+    Each line holds ``tier`` and either the ``/analyze`` response as
+    ``result`` or an ``error``. A cached result is sent as the deep tier
+    alone.
+    """
+    if fingerprints is None or cms_fingerprints is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    url, debug, headless = req.url, bool(req.debug), bool(req.headless)
+    key = _cache_key(url, headless)
+
+    async def lines() -> AsyncIterator[str]:
+        found = None if req.force else cache.lookup(key)
+        if found is not None:
+            result, stale = found
+            if stale:
+                _schedule_refresh(key, url, debug, headless)
+            yield ndjson_line(
+                {"tier": "deep", "result": _format_result(result, debug, stale)}
+            )
+            return
+        try:
+            async for tier, result in _analyze_tiered(key, url, debug, headless):
+                yield ndjson_line(
+                    {"tier": tier, "result": _format_result(result, debug)}
+                )
+        except Exception:  # noqa: BLE001
+            logging.exception("unexpected error analyzing URL")
+            yield ndjson_line({"tier": "deep", "error": "internal error"})
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(req: BatchAnalyzeRequest) -> StreamingResponse:
+    """Analyse many URLs, streaming one NDJSON line per URL as it completes.
+
+    Each line holds the position of the URL in the request as ``index`` and
+    either the ``/analyze`` response as ``result`` or an ``error``.
+    """
+    if fingerprints is None or cms_fingerprints is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    if len(req.urls) > MAX_BATCH_URLS:
+        raise HTTPException(
+            status_code=413, detail=f"at most {MAX_BATCH_URLS} URLs per batch"
+        )
+
+    debug, headless = bool(req.debug), bool(req.headless)
+
+    async def lines() -> AsyncIterator[str]:
+        # Cached results are emitted straight away. Misses are grouped by
+        # flight so a URL listed twice is analysed once; flights already
+        # started by other requests are joined and the rest go through the
+        # staged pipeline.
+        groups: dict[str, list[tuple[int, str]]] = {}
+        for index, url in enumerate(req.urls):
+            key = _cache_key(url, headless)
+            found = None if req.force else cache.lookup(key)
+            if found is None:
+                groups.setdefault(_flight_key(key, debug), []).append((index, url))
+                continue
+            result, stale = found
+            if stale:
+                _schedule_refresh(key, url, debug, headless)
+            yield ndjson_line(
+                {"index": index, "url": url, "result": _format_result(result, debug, stale)}
+            )
+        if not groups:
+            return
+
+        def group_lines(flight: str, result: Any) -> Iterator[str]:
+            for index, url in groups[flight]:
+                line: dict[str, Any] = {"index": index, "url": url}
+                if isinstance(result, BaseException):
+                    line["error"] = "internal error"
+                else:
+                    line["result"] = _format_result(result, debug)
+                yield ndjson_line(line)
+
+        async def join(flight: str) -> tuple[str, Any]:
+            url = groups[flight][0][1]
+            try:
+                return flight, await _analyze_cached(
+                    _cache_key(url, headless), url, debug, headless
+                )
+            except Exception as exc:  # noqa: BLE001
+                logging.error("unexpected error analyzing URL", exc_info=exc)
+                return flight, exc
+
+        # A flight is claimed only when its page is pulled into the pipeline,
+        # so other callers start their own analysis of URLs still waiting in
+        # this batch. ``entered`` follows the pipeline's item order.
+        entered: list[tuple[str, asyncio.Future[Any]]] = []
+        joined: list[asyncio.Task[tuple[str, Any]]] = []
+
+        def states() -> Iterator[PageAnalysis]:
+            for flight, items in groups.items():
+                future = inflight.claim(flight)
+                if future is None:
+                    joined.append(asyncio.create_task(join(flight)))
+                    continue
+                entered.append((flight, future))
+                yield PageAnalysis(items[0][1], debug, headless)
+
+        def settle(pos: int, state: PageAnalysis, result: Any) -> None:
+            # Runs as the page leaves the pipeline, so joined callers do not
+            # wait for this batch's reader.
+            _, future = entered[pos]
+            if future.done():
+                return
+            if isinstance(result, BaseException):
+                logging.error("unexpected error analyzing URL", exc_info=result)
+                future.set_exception(result)
+                future.exception()  # mark retrieved; joined callers re-raise it
+            else:
+                _store_result(_cache_key(state.url, headless), state.url, result)
+                future.set_result(result)
+
+        proxy = _outbound_proxy()
+        client = getattr(app.state, "client", None)
+        close_client = client is None
+        if client is None:
+            client = httpx.AsyncClient(timeout=10, proxy=proxy)
+        results = build_pipeline(client, proxy).run(states(), on_result=settle)
+        try:
+            async for pos, _state, result in results:
+                for line in group_lines(entered[pos][0], result):
+                    yield line
+            for next_done in asyncio.as_completed(joined):
+                flight, result = await next_done
+                for line in group_lines(flight, result):
+                    yield line
+        finally:
+            await results.aclose()
+            # Pages this batch had claimed but not finished are completed in
+            # the background for the callers that joined them.
+            for flight, future in entered:
+                if not future.done():
+                    url = groups[flight][0][1]
+                    _hand_off(future, _cache_key(url, headless), url, debug, headless)
+            for task in joined:
+                task.cancel()
+            if close_client and hasattr(client, "aclose"):
+                await client.aclose()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def _analyze_job_url(url: str, options: dict[str, Any]) -> dict[str, Any]:
+    return await _analyze_request(
+        url, False, bool(options.get("headless")), bool(options.get("force"))
+    )
+
+
+job_store = JobStore(JOBS_DB_PATH)
+job_runner = JobRunner(
+    job_store, _analyze_job_url, JOB_CONCURRENCY, lease=JOB_LEASE_SECONDS
+)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(req: JobRequest) -> JSONResponse:
+    """Queue a bulk analysis of ``urls`` and return the job status."""
+    if fingerprints is None or cms_fingerprints is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    if len(req.urls) > MAX_JOB_URLS:
+        raise HTTPException(
+            status_code=413, detail=f"at most {MAX_JOB_URLS} URLs per job"
+        )
+    job_id = job_store.create(
+        req.urls, {"headless": bool(req.headless), "force": bool(req.force)}
+    )
+    job_runner.submit(job_id)
+    return JSONResponse(job_store.get(job_id), status_code=202)
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str) -> JSONResponse:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return JSONResponse(job)
+
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str, offset: int = 0, limit: int = 100) -> JSONResponse:
+    """Return a page of finished results in URL order.
+
+    ``next_offset`` is ``None`` once all finished results have been returned.
+    Items finish out of order, so pages are only stable once the job is done.
+    """
+    if job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    limit = max(1, min(limit, 1000))
+    items = job_store.results(job_id, max(offset, 0), limit)
+    next_offset = offset + len(items) if len(items) == limit else None
+    return JSONResponse({"items": items, "next_offset": next_offset})
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> JSONResponse:
+    if not job_runner.cancel(job_id):
+        raise HTTPException(status_code=404, detail="job not found")
+    return JSONResponse(job_store.get(job_id))
 
 
 @app.post("/generate")
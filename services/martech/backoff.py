@@ -0,0 +1,117 @@
+"""Per-host exponential backoff after failed page fetches.
+
+Dead or unreachable targets would otherwise be retried at full cost on every
+request, tying up connection slots during bulk crawls. Each failure is
+classified, and the host is skipped for a base delay that depends on the
+error class and doubles with every consecutive failure. The same delay is
+used as the TTL for the cached negative result.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping
+from urllib.parse import urlparse
+
+import httpx
+
+# Base delay in seconds per error class.
+DEFAULT_BASE_DELAYS = {
+    "timeout": 60.0,
+    "connect": 300.0,
+    "other": 120.0,
+}
+
+
+def classify_error(exc: BaseException) -> str:
+    """Return the error class of a failed fetch."""
+    if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(exc, httpx.ConnectError):
+        return "connect"
+    return "other"
+
+
+def host_of(url: str) -> str:
+    """Return the lower-cased ``host[:port]`` that backoff is tracked by."""
+    cleaned = url.strip()
+    if "://" not in cleaned:
+        cleaned = "https://" + cleaned
+    return urlparse(cleaned).netloc.lower()
+
+
+@dataclass
+class HostState:
+    failures: int
+    error: str
+    until: float
+
+
+class HostBackoff:
+    """Track consecutive fetch failures per host."""
+
+    def __init__(
+        self,
+        base_delays: Mapping[str, float] | None = None,
+        max_delay: float = 3600.0,
+        max_hosts: int = 10_000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.base_delays = dict(DEFAULT_BASE_DELAYS, **(base_delays or {}))
+        self.max_delay = max_delay
+        self.max_hosts = max_hosts
+        self._clock = clock
+        self._hosts: dict[str, HostState] = {}
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def remaining(self, host: str) -> float:
+        """Return how many seconds ``host`` is still backed off for."""
+        state = self._hosts.get(host)
+        if state is None:
+            return 0.0
+        return max(state.until - self._clock(), 0.0)
+
+    def blocked(self, host: str) -> str | None:
+        """Return the error class if ``host`` is backed off, else ``None``."""
+        state = self._hosts.get(host)
+        if state is None or state.until <= self._clock():
+            return None
+        self.skipped += 1
+        return state.error
+
+    def failure(self, host: str, exc: BaseException) -> float:
+        """Record a failed fetch and return the new backoff delay."""
+        error = classify_error(exc)
+        state = self._hosts.get(host)
+        failures = state.failures + 1 if state is not None else 1
+        base = self.base_delays.get(error, self.base_delays["other"])
+        # The exponent is capped so hosts that stay down cannot overflow it.
+        delay = min(base * 2 ** min(failures - 1, 32), self.max_delay)
+        if state is None and len(self._hosts) >= self.max_hosts:
+            self._purge()
+        self._hosts[host] = HostState(failures, error, self._clock() + delay)
+        return delay
+
+    def success(self, host: str) -> None:
+        self._hosts.pop(host, None)
+
+    def _purge(self) -> None:
+        now = self._clock()
+        # Keep expired hosts' failure counts only while there is room.
+        for host in [h for h, s in self._hosts.items() if s.until <= now]:
+            del self._hosts[host]
+        while len(self._hosts) >= self.max_hosts:
+            del self._hosts[next(iter(self._hosts))]
+
+    def stats(self) -> dict[str, Any]:
+        now = self._clock()
+        return {
+            "hosts": len(self._hosts),
+            "blocked": sum(1 for s in self._hosts.values() if s.until > now),
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,159 @@
+"""Long-lived Playwright browser shared by headless analyses.
+
+Launching Firefox costs seconds and hundreds of megabytes, so
+:class:`BrowserPool` starts one browser for the lifetime of the service and
+hands out a bounded number of reusable browser contexts. A context is
+replaced after serving ``max_pages`` pages or when it fails to open or close
+a page, and the browser is relaunched when it disconnects. Callers wait at most ``acquire_timeout``
+seconds for a free context.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+
+@dataclass
+class _Slot:
+    context: Any = None
+    pages: int = 0
+    # Browser the context was created on; contexts of a replaced browser
+    # are dead.
+    browser: Any = None
+
+
+class BrowserPool:
+    """Bounded pool of Firefox contexts on one persistent browser."""
+
+    def __init__(self, size: int, max_pages: int, acquire_timeout: float) -> None:
+        self.size = size
+        self.max_pages = max_pages
+        self.acquire_timeout = acquire_timeout
+        self.proxy: str | None = None
+        self._pw: Any = None
+        self._browser: Any = None
+        self._slots: asyncio.Queue[_Slot] | None = None
+        self._launch_lock: asyncio.Lock | None = None
+        self.busy = 0
+        self.waiting = 0
+        self.pages = 0
+        self.recycled = 0
+        self.timeouts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._browser is not None
+
+    async def start(self, proxy: str | None = None) -> None:
+        """Start Playwright and launch the browser."""
+        from playwright.async_api import async_playwright
+
+        self.proxy = proxy
+        self._pw = await async_playwright().start()
+        self._launch_lock = asyncio.Lock()
+        try:
+            self._browser = await self._pw.firefox.launch(headless=True)
+        except BaseException:
+            await self._pw.stop()
+            self._pw = None
+            raise
+        self._slots = asyncio.Queue()
+        for _ in range(self.size):
+            self._slots.put_nowait(_Slot())
+
+    async def stop(self) -> None:
+        browser, pw = self._browser, self._pw
+        self._browser = self._pw = self._slots = None
+        try:
+            if browser is not None:
+                await browser.close()
+        finally:
+            if pw is not None:
+                await pw.stop()
+
+    async def _ensure_browser(self) -> Any:
+        assert self._launch_lock is not None
+        async with self._launch_lock:
+            if not self._browser.is_connected():
+                logging.warning("headless browser disconnected; relaunching")
+                self._browser = await self._pw.firefox.launch(headless=True)
+        return self._browser
+
+    async def _recycle(self, slot: _Slot) -> None:
+        if slot.context is not None:
+            self.recycled += 1
+            try:
+                await slot.context.close()
+            except Exception:  # noqa: BLE001
+                pass
+        slot.context, slot.pages, slot.browser = None, 0, None
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """Yield a fresh page from a pooled context.
+
+        Raises :class:`asyncio.TimeoutError` if no context frees up within
+        ``acquire_timeout`` seconds.
+        """
+        if self._slots is None:
+            raise RuntimeError("browser pool is not running")
+        self.waiting += 1
+        try:
+            slot = await asyncio.wait_for(self._slots.get(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+        self.busy += 1
+        try:
+            page = await self._open_page(slot)
+        except BaseException:
+            await self._recycle(slot)
+            self._release(slot)
+            raise
+        try:
+            yield page
+        finally:
+            try:
+                await page.close()
+            except Exception:  # noqa: BLE001
+                await self._recycle(slot)
+            self._release(slot)
+
+    async def _open_page(self, slot: _Slot) -> Any:
+        browser = await self._ensure_browser()
+        if slot.context is not None and (
+            slot.pages >= self.max_pages or slot.browser is not browser
+        ):
+            await self._recycle(slot)
+        if slot.context is None:
+            options: dict[str, Any] = {"java_script_enabled": False}
+            if self.proxy:
+                options["proxy"] = {"server": self.proxy}
+            slot.context = await browser.new_context(**options)
+            slot.browser = browser
+        page = await slot.context.new_page()
+        slot.pages += 1
+        self.pages += 1
+        return page
+
+    def _release(self, slot: _Slot) -> None:
+        self.busy -= 1
+        if self._slots is not None:
+            self._slots.put_nowait(slot)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "size": self.size,
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "pages": self.pages,
+            "recycled": self.recycled,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,356 @@
+"""Bounded in-memory cache of ``/analyze`` results.
+
+Entries expire after a TTL and the cache is bounded both by entry count and
+by an approximate byte budget, evicting least-recently-used entries first.
+Expired entries may still be served for an optional ``stale_ttl`` window
+while the caller refreshes them. Entries past that window are dropped lazily
+on lookup and periodically by :meth:`AnalysisCache.purge_expired`, which the
+service runs in the background.
+
+An optional :class:`CacheBackend` such as :class:`SQLiteBackend` persists
+entries beyond the process, with the in-memory LRU acting as a front tier.
+
+:class:`SingleFlight` lets concurrent misses for the same key share a single
+analysis.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Protocol, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class CacheEntry:
+    data: dict[str, Any]
+    stored: float
+    expires: float
+    size: int
+
+
+def approximate_size(data: Any) -> int:
+    """Return the approximate memory cost of ``data`` in bytes.
+
+    The JSON encoding is a stable, cheap proxy for the size of the nested
+    dicts and lists that analysis results consist of.
+    """
+    try:
+        return len(json.dumps(data, default=str))
+    except (TypeError, ValueError):
+        return len(repr(data))
+
+
+class CacheBackend(Protocol):
+    """Shared storage behind the in-memory tier of :class:`AnalysisCache`."""
+
+    def get(self, key: str) -> CacheEntry | None: ...
+
+    def set(self, key: str, entry: CacheEntry) -> None: ...
+
+    def delete(self, key: str, before: float | None = None) -> None: ...
+
+    def purge(self, before: float) -> int: ...
+
+    def clear(self) -> None: ...
+
+
+class SQLiteBackend:
+    """Store zlib-compressed JSON results in an SQLite database.
+
+    The database runs in WAL mode so every uvicorn worker on a host can read
+    while another writes, and entries survive restarts. Expiry times are
+    wall-clock timestamps shared by all processes. Database errors are
+    logged and treated as misses so a broken file never fails a request.
+
+    Calls run on the event loop, so lock waits are capped at ``busy_timeout``
+    seconds; a database still locked by another worker after that counts as
+    a miss (or a skipped write) in ``busy`` instead of stalling the loop.
+    """
+
+    def __init__(
+        self, path: str | Path, timeout: float = 5.0, busy_timeout: float = 0.05
+    ) -> None:
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self.busy = 0
+        # The longer timeout only covers schema setup at start-up.
+        self._db = sqlite3.connect(
+            self.path, timeout=timeout, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analysis ("
+            "key TEXT PRIMARY KEY, stored REAL, expires REAL, size INTEGER, data BLOB)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS analysis_expires ON analysis (expires)"
+        )
+        self._db.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    def _execute(self, sql: str, params: tuple[Any, ...] = ()) -> sqlite3.Cursor | None:
+        try:
+            with self._lock:
+                return self._db.execute(sql, params)
+        except sqlite3.OperationalError as exc:
+            if "locked" not in str(exc) and "busy" not in str(exc):
+                logging.warning("analysis cache database error", exc_info=True)
+            else:
+                self.busy += 1
+            return None
+        except sqlite3.Error:
+            logging.warning("analysis cache database error", exc_info=True)
+            return None
+
+    def get(self, key: str) -> CacheEntry | None:
+        cur = self._execute(
+            "SELECT stored, expires, size, data FROM analysis WHERE key = ?", (key,)
+        )
+        row = cur.fetchone() if cur is not None else None
+        if row is None:
+            return None
+        stored, expires, size, blob = row
+        try:
+            data = json.loads(zlib.decompress(blob))
+        except (zlib.error, ValueError):
+            self.delete(key)
+            return None
+        return CacheEntry(data, stored, expires, size)
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        blob = zlib.compress(json.dumps(entry.data, default=str).encode())
+        self._execute(
+            "INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?)",
+            (key, entry.stored, entry.expires, entry.size, blob),
+        )
+
+    def delete(self, key: str, before: float | None = None) -> None:
+        """Delete ``key``; with ``before``, only if it expired by then."""
+        if before is None:
+            self._execute("DELETE FROM analysis WHERE key = ?", (key,))
+        else:
+            self._execute(
+                "DELETE FROM analysis WHERE key = ? AND expires <= ?", (key, before)
+            )
+
+    def purge(self, before: float) -> int:
+        cur = self._execute("DELETE FROM analysis WHERE expires <= ?", (before,))
+        return cur.rowcount if cur is not None else 0
+
+    def clear(self) -> None:
+        self._execute("DELETE FROM analysis")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class AnalysisCache:
+    """LRU cache of analysis results with TTL and size limits."""
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        max_bytes: int,
+        stale_ttl: float = 0,
+        backend: CacheBackend | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.backend = backend
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.backend_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the fresh result stored under ``key`` or ``None``."""
+        found = self.lookup(key, allow_stale=False)
+        return found[0] if found is not None else None
+
+    def lookup(
+        self, key: str, allow_stale: bool = True
+    ) -> tuple[dict[str, Any], bool] | None:
+        """Return ``(result, stale)`` for ``key`` or ``None`` on a miss.
+
+        ``stale`` is true for expired entries still inside the ``stale_ttl``
+        window; they are only returned when ``allow_stale`` is set.
+        """
+        entry = self._entries.get(key)
+        now = self._clock()
+        if (entry is None or entry.expires <= now) and self.backend is not None:
+            # Another worker may have stored a newer result.
+            shared = self.backend.get(key)
+            if (
+                shared is not None
+                and shared.expires + self.stale_ttl > now
+                and (entry is None or shared.expires > entry.expires)
+            ):
+                self.backend_hits += 1
+                self._insert(key, shared)
+                entry = shared
+        if entry is not None and entry.expires + self.stale_ttl <= now:
+            self._remove(key)
+            if self.backend is not None:
+                self.backend.delete(key, before=now - self.stale_ttl)
+            self.expirations += 1
+            entry = None
+        stale = entry is not None and entry.expires <= now
+        if entry is None or (stale and not allow_stale):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return entry.data, stale
+
+    def set(self, key: str, data: dict[str, Any], ttl: float | None = None) -> None:
+        """Store ``data`` under ``key`` and evict entries over the limits.
+
+        ``ttl`` overrides the cache-wide TTL for this entry.
+        """
+        now = self._clock()
+        expires = now + (self.ttl if ttl is None else ttl)
+        entry = CacheEntry(data, now, expires, approximate_size(data))
+        self._insert(key, entry)
+        if self.backend is not None:
+            self.backend.set(key, entry)
+
+    def _insert(self, key: str, entry: CacheEntry) -> None:
+        self._remove(key)
+        if entry.size > self.max_bytes or self.max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def purge_expired(self) -> int:
+        """Drop entries past their stale window and return how many."""
+        now = self._clock() - self.stale_ttl
+        expired = [k for k, e in self._entries.items() if e.expires <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        if self.backend is not None:
+            self.backend.purge(now)
+        return len(expired)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "backend_busy": getattr(self.backend, "busy", 0),
+            "hits": self.hits,
+            "backend_hits": self.backend_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SingleFlight:
+    """Share one in-flight task between concurrent callers of the same key."""
+
+    def __init__(self) -> None:
+        self._tasks: dict[str, asyncio.Future[Any]] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._tasks
+
+    def _register(self, key: str, future: asyncio.Future[Any]) -> None:
+        self.started += 1
+        self._tasks[key] = future
+
+        def done(_: asyncio.Future[Any]) -> None:
+            if self._tasks.get(key) is future:
+                del self._tasks[key]
+
+        future.add_done_callback(done)
+
+    def claim(self, key: str) -> asyncio.Future[Any] | None:
+        """Register a flight for ``key`` that the caller completes itself.
+
+        Returns a future to resolve with the result, or ``None`` if ``key``
+        is already in flight. Concurrent :meth:`run` calls join the future.
+        """
+        if key in self._tasks:
+            return None
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self._register(key, future)
+        return future
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await ``factory()`` once for all concurrent callers with ``key``.
+
+        The shared task is shielded so a caller that goes away does not
+        cancel it for the others.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._register(key, task)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self._tasks),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,190 @@
+"""Run HTML parsing and fingerprint matching off the event loop.
+
+Parsing a multi-megabyte page or matching it against hundreds of patterns
+takes long enough to stall every other request served by the same event
+loop. :class:`CpuPool` sends such work to a :class:`ProcessPoolExecutor`
+whose workers load the fingerprint definitions once at start-up, while small
+pages below ``min_bytes`` are still handled inline where the round trip to a
+worker would cost more than the work itself.
+
+:class:`LoopLagMonitor` measures how late the event loop wakes up, which is
+the latency every other coroutine pays while CPU-bound work runs inline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Mapping, Sequence
+
+from services.shared.document import PageDocument, parse_document
+from services.shared.fingerprint import (
+    FingerprintSet,
+    PageModel,
+    compile_fingerprints,
+    detect_all,
+)
+
+PageArgs = tuple[
+    str, str, Mapping[str, str], Mapping[str, str], Sequence[str], Sequence[str]
+]
+
+# Fingerprint definitions preloaded in a worker process, keyed by version.
+_worker_sets: dict[str, dict[str, Any]] = {}
+
+
+def _init_worker(definitions: list[dict[str, Any]]) -> None:
+    for data in definitions:
+        engine = compile_fingerprints(data)
+        _worker_sets[engine.version] = data
+
+
+def _parse_in_worker(html: str) -> PageDocument:
+    return parse_document(html)
+
+
+def _detect_in_worker(
+    page_args: PageArgs, specs: list[tuple[str, str, bool]]
+) -> dict[str, dict[str, Any]]:
+    sets = [
+        FingerprintSet(name, _worker_sets[version], include_scripts)
+        for name, version, include_scripts in specs
+    ]
+    return detect_all(PageModel(*page_args), sets)
+
+
+class CpuPool:
+    """Parse and match pages inline or in worker processes by size."""
+
+    def __init__(self, workers: int, min_bytes: int) -> None:
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self._executor: ProcessPoolExecutor | None = None
+        self._versions: frozenset[str] = frozenset()
+        self.inline = 0
+        self.offloaded = 0
+        self.failures = 0
+
+    def _offload(self, size: int) -> bool:
+        return self.workers > 0 and size >= self.min_bytes
+
+    def _pool(self, sets: Sequence[FingerprintSet]) -> ProcessPoolExecutor:
+        """Return an executor whose workers know every fingerprint set."""
+        engines = [compile_fingerprints(s.fingerprints) for s in sets]
+        versions = frozenset(engine.version for engine in engines)
+        if self._executor is None or not versions <= self._versions:
+            self.shutdown()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=([dict(engine.data) for engine in engines],),
+            )
+            self._versions = versions
+        return self._executor
+
+    async def parse(
+        self, html: str, sets: Sequence[FingerprintSet]
+    ) -> PageDocument:
+        """Parse ``html``; ``sets`` are preloaded if the pool has to start."""
+        if self._offload(len(html)):
+            try:
+                doc = await asyncio.get_running_loop().run_in_executor(
+                    self._pool(sets), _parse_in_worker, html
+                )
+            except BrokenProcessPool:
+                self._broken()
+            else:
+                self.offloaded += 1
+                return doc
+        self.inline += 1
+        return parse_document(html)
+
+    async def detect(
+        self, page_args: PageArgs, sets: Sequence[FingerprintSet]
+    ) -> dict[str, dict[str, Any]]:
+        size = len(page_args[0]) + sum(len(body) for body in page_args[5])
+        if self._offload(size):
+            specs = [
+                (s.name, compile_fingerprints(s.fingerprints).version, s.include_scripts)
+                for s in sets
+            ]
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._pool(sets), _detect_in_worker, page_args, specs
+                )
+            except BrokenProcessPool:
+                self._broken()
+            else:
+                self.offloaded += 1
+                return result
+        self.inline += 1
+        return detect_all(PageModel(*page_args), sets)
+
+    def _broken(self) -> None:
+        logging.error("CPU worker pool broke; running inline until it restarts")
+        self.failures += 1
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._versions = frozenset()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "min_bytes": self.min_bytes,
+            "running": self._executor is not None,
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+            "failures": self.failures,
+        }
+
+
+class LoopLagMonitor:
+    """Sample how late the event loop runs a timer every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.1) -> None:
+        self.interval = interval
+        self.samples = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(time.perf_counter() - start - self.interval)
+
+    def record(self, lag: float) -> None:
+        lag = max(lag, 0.0)
+        self.samples += 1
+        self.total += lag
+        self.last = lag
+        self.max = max(self.max, lag)
+
+    def stats(self) -> dict[str, Any]:
+        mean = self.total / self.samples if self.samples else 0.0
+        return {
+            "samples": self.samples,
+            "last_ms": round(self.last * 1000, 3),
+            "mean_ms": round(mean * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
@@ -0,0 +1,329 @@
+"""Bulk analysis jobs backed by a local SQLite store.
+
+A job is a list of URLs analysed in the background. Every URL is stored as its
+own row and marked done as soon as its result is written, so a restarted
+service resumes unfinished jobs where they stopped. :class:`JobRunner` runs
+jobs on the event loop with a fixed number of analysis slots shared by all
+jobs.
+
+Several workers may share one store. A runner claims a job atomically and
+keeps touching it while it runs; a job whose owner stopped touching it for
+``lease`` seconds is taken over by another runner.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from services.shared.batch import map_unordered
+
+# Job states; ``queued`` and ``running`` jobs are resumed on startup.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+Analyzer = Callable[[str, dict[str, Any]], Awaitable[dict[str, Any]]]
+
+
+class JobStore:
+    """Persist jobs and per-URL results in SQLite."""
+
+    def __init__(self, path: str | Path = ":memory:", timeout: float = 5.0) -> None:
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.path, timeout=timeout, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL commits then skip the fsync; only a power loss can lose the
+        # most recent results, which are analysed again on resume.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                options TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                owner TEXT
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                PRIMARY KEY (job_id, idx)
+            );
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _execute(self, sql: str, params: tuple[Any, ...] = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, params)
+
+    def create(self, urls: list[str], options: dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute(
+                    "INSERT INTO jobs (id, status, options, total, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, json.dumps(options), len(urls), now, now),
+                )
+                self._db.executemany(
+                    "INSERT INTO job_items (job_id, idx, url) VALUES (?, ?, ?)",
+                    [(job_id, i, url) for i, url in enumerate(urls)],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        """Return the status and progress of ``job_id``."""
+        row = self._execute(
+            "SELECT status, options, total, created, updated FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        status, options, total, created, updated = row
+        done, failed = self._execute(
+            "SELECT COUNT(*), COUNT(error) FROM job_items WHERE job_id = ? AND done = 1",
+            (job_id,),
+        ).fetchone()
+        return {
+            "id": job_id,
+            "status": status,
+            "options": json.loads(options),
+            "total": total,
+            "done": done,
+            "failed": failed,
+            "created": created,
+            "updated": updated,
+        }
+
+    def set_status(self, job_id: str, status: str) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, updated = ? WHERE id = ?",
+            (status, time.time(), job_id),
+        )
+
+    def status(self, job_id: str) -> str | None:
+        row = self._execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """Mark ``job_id`` running for ``owner`` unless another owner holds it.
+
+        Queued jobs, running jobs without an owner and running jobs whose
+        owner has not touched them for ``lease`` seconds can be claimed.
+        """
+        now = time.time()
+        cur = self._execute(
+            "UPDATE jobs SET status = ?, owner = ?, updated = ? WHERE id = ? AND ("
+            "status = ? OR (status = ? AND "
+            "(owner IS NULL OR owner = ? OR updated < ?)))",
+            (RUNNING, owner, now, job_id, QUEUED, RUNNING, owner, now - lease),
+        )
+        return cur.rowcount == 1
+
+    def touch(self, job_ids: list[str], owner: str) -> None:
+        """Renew the lease of the running jobs of ``owner``."""
+        for job_id in job_ids:
+            self._execute(
+                "UPDATE jobs SET updated = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time(), job_id, owner, RUNNING),
+            )
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel ``job_id`` if it is queued or running; return whether it was."""
+        cur = self._execute(
+            "UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), job_id, QUEUED, RUNNING),
+        )
+        return cur.rowcount == 1
+
+    def finish(self, job_id: str, owner: str) -> None:
+        """Mark ``job_id`` done unless it was cancelled or taken over."""
+        self._execute(
+            "UPDATE jobs SET status = ?, updated = ? "
+            "WHERE id = ? AND owner = ? AND status = ?",
+            (DONE, time.time(), job_id, owner, RUNNING),
+        )
+
+    def pending(self, job_id: str) -> list[tuple[int, str]]:
+        return self._execute(
+            "SELECT idx, url FROM job_items WHERE job_id = ? AND done = 0 ORDER BY idx",
+            (job_id,),
+        ).fetchall()
+
+    def complete(
+        self,
+        job_id: str,
+        idx: int,
+        result: dict[str, Any] | None = None,
+        error: str | None = None,
+    ) -> None:
+        self._execute(
+            "UPDATE job_items SET done = 1, result = ?, error = ? "
+            "WHERE job_id = ? AND idx = ?",
+            (json.dumps(result) if result is not None else None, error, job_id, idx),
+        )
+
+    def results(
+        self, job_id: str, offset: int = 0, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        """Return finished items of ``job_id`` in URL order."""
+        rows = self._execute(
+            "SELECT idx, url, result, error FROM job_items "
+            "WHERE job_id = ? AND done = 1 ORDER BY idx LIMIT ? OFFSET ?",
+            (job_id, limit, offset),
+        ).fetchall()
+        items = []
+        for idx, url, result, error in rows:
+            item: dict[str, Any] = {"index": idx, "url": url}
+            if error is not None:
+                item["error"] = error
+            else:
+                item["result"] = json.loads(result) if result else None
+            items.append(item)
+        return items
+
+    def unfinished(self) -> list[str]:
+        return [
+            row[0]
+            for row in self._execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobRunner:
+    """Run stored jobs with ``concurrency`` analysis slots shared by all jobs."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        analyze: Analyzer,
+        concurrency: int,
+        lease: float = 300.0,
+    ) -> None:
+        self.store = store
+        self.analyze = analyze
+        self.concurrency = concurrency
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self._slots: asyncio.Semaphore | None = None
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._watcher: asyncio.Task[None] | None = None
+
+    def resume(self) -> None:
+        """Start every unfinished job that no live runner owns."""
+        for job_id in self.store.unfinished():
+            self.submit(job_id)
+
+    def start(self) -> None:
+        """Resume jobs now and keep renewing leases and adopting orphans."""
+        self.resume()
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                self.store.touch(list(self._tasks), self.owner)
+                self.resume()
+            except Exception:  # noqa: BLE001
+                logging.exception("failed to renew job leases")
+
+    def submit(self, job_id: str) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel ``job_id``; finished items are kept. Return ``False`` if unknown."""
+        if not self.store.cancel(job_id) and self.store.status(job_id) is None:
+            return False
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return True
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job_id: str) -> None:
+        if not self.store.claim(job_id, self.owner, self.lease):
+            return
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        slots = self._slots
+        options = job["options"]
+
+        async def run(item: tuple[int, str]) -> dict[str, Any]:
+            async with slots:
+                return await self.analyze(item[1], options)
+
+        def record(idx: int, result: dict[str, Any] | BaseException) -> str | None:
+            if isinstance(result, BaseException):
+                detail = getattr(result, "detail", None) or "internal error"
+                self.store.complete(job_id, idx, error=str(detail))
+            else:
+                self.store.complete(job_id, idx, result=result)
+            return self.store.status(job_id)
+
+        results = map_unordered(self.store.pending(job_id), run, self.concurrency)
+        try:
+            async for _, (idx, _url), result in results:
+                # Writes run off the loop; the status read catches a cancel
+                # made through another worker.
+                if await asyncio.to_thread(record, idx, result) == CANCELLED:
+                    logging.info("job %s cancelled", job_id)
+                    return
+        finally:
+            await results.aclose()
+        self.store.finish(job_id, self.owner)
+        logging.info("job %s finished", job_id)
+
+    def stats(self) -> dict[str, Any]:
+        return {"running": len(self._tasks), "concurrency": self.concurrency}
@@ -0,0 +1,61 @@
+"""Analyse a list of URLs offline through the staged pipeline.
+
+Run from the repository root::
+
+    python -m services.martech.offline urls.txt > results.ndjson
+
+URLs are read one per line (``-`` reads stdin). One NDJSON line is written
+per URL as it completes, and per-stage metrics are printed to stderr at the
+end.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any, TextIO
+
+import httpx
+
+from services.martech import app as martech
+from services.shared.batch import ndjson_line
+
+
+def read_urls(stream: TextIO) -> list[str]:
+    return [line.strip() for line in stream if line.strip() and not line.startswith("#")]
+
+
+async def run(urls: list[str], headless: bool, out: TextIO) -> dict[str, Any]:
+    await martech._startup()
+    proxy = martech._outbound_proxy()
+    async with httpx.AsyncClient(timeout=10, proxy=proxy) as client:
+        pipeline = martech.build_pipeline(client, proxy)
+        states = [martech.PageAnalysis(url, headless=headless) for url in urls]
+        async for index, state, result in pipeline.run(states):
+            line: dict[str, Any] = {"index": index, "url": state.url}
+            if isinstance(result, BaseException):
+                line["error"] = repr(result)
+            else:
+                line["result"] = martech._format_result(result, debug=False)
+            out.write(ndjson_line(line))
+    return {stage.name: stage.metrics.snapshot() for stage in pipeline.stages}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("urls", help="file with one URL per line, or - for stdin")
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+    if args.urls == "-":
+        urls = read_urls(sys.stdin)
+    else:
+        with open(args.urls) as fh:
+            urls = read_urls(fh)
+    metrics = asyncio.run(run(urls, args.headless, sys.stdout))
+    print(json.dumps(metrics, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Staged asynchronous pipeline for bulk analysis.
+
+Each :class:`Stage` runs its own pool of workers and hands items to the next
+stage through a bounded queue. A slow stage therefore fills its input queue
+and stalls the stages before it instead of letting work pile up in memory,
+while network-bound and CPU-bound stages keep independent concurrency.
+:class:`StageMetrics` record throughput and queue depth per stage.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Iterable
+
+StageFn = Callable[[Any], Awaitable[Any]]
+
+
+@dataclass
+class StageMetrics:
+    processed: int = 0
+    failed: int = 0
+    busy: int = 0
+    seconds: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+    # Input queues of the runs currently using this stage.
+    inputs: set[asyncio.Queue[Any]] = field(default_factory=set)
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy": self.busy,
+            "queue_depth": sum(q.qsize() for q in self.inputs),
+            "busy_seconds": round(self.seconds, 3),
+            "items_per_second": round(self.processed / elapsed, 3),
+        }
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: StageFn
+    concurrency: int = 1
+    metrics: StageMetrics = field(default_factory=StageMetrics)
+
+
+@dataclass
+class _Envelope:
+    index: int
+    source: Any
+    value: Any
+    error: BaseException | None = None
+
+
+_END = object()
+
+
+class Pipeline:
+    """Run items through ``stages`` with queues of at most ``queue_size``."""
+
+    def __init__(self, stages: list[Stage], queue_size: int = 16) -> None:
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+
+    async def run(
+        self,
+        items: Iterable[Any],
+        on_result: Callable[[int, Any, Any], None] | None = None,
+    ) -> AsyncGenerator[tuple[int, Any, Any], None]:
+        """Yield ``(index, item, result)`` as items leave the last stage.
+
+        An exception raised by a stage replaces the result and the item skips
+        the remaining stages. ``on_result`` is called with the same values as
+        soon as an item leaves the last stage, before it waits for the
+        consumer. ``items`` is consumed lazily as the first queue has room.
+        Closing the iterator early cancels all workers.
+        """
+        queues: list[asyncio.Queue[Any]] = [
+            asyncio.Queue(self.queue_size) for _ in range(len(self.stages) + 1)
+        ]
+        tasks: list[asyncio.Task[None]] = []
+
+        async def feed() -> None:
+            for index, item in enumerate(items):
+                await queues[0].put(_Envelope(index, item, item))
+            for _ in range(self.stages[0].concurrency):
+                await queues[0].put(_END)
+
+        async def work(pos: int, stage: Stage, remaining: list[int]) -> None:
+            inbox, outbox = queues[pos], queues[pos + 1]
+            metrics = stage.metrics
+            last = pos + 1 == len(self.stages)
+            while True:
+                env = await inbox.get()
+                if env is _END:
+                    break
+                if env.error is None:
+                    metrics.busy += 1
+                    start = time.perf_counter()
+                    try:
+                        env.value = await stage.fn(env.value)
+                    except Exception as exc:  # noqa: BLE001
+                        env.error = exc
+                        metrics.failed += 1
+                    else:
+                        metrics.processed += 1
+                    finally:
+                        metrics.busy -= 1
+                        metrics.seconds += time.perf_counter() - start
+                if last and on_result is not None:
+                    on_result(
+                        env.index,
+                        env.source,
+                        env.error if env.error is not None else env.value,
+                    )
+                await outbox.put(env)
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                next_workers = 1 if last else self.stages[pos + 1].concurrency
+                for _ in range(next_workers):
+                    await outbox.put(_END)
+
+        for stage, queue in zip(self.stages, queues):
+            stage.metrics.inputs.add(queue)
+        tasks.append(asyncio.create_task(feed()))
+        for pos, stage in enumerate(self.stages):
+            remaining = [stage.concurrency]
+            for _ in range(stage.concurrency):
+                tasks.append(asyncio.create_task(work(pos, stage, remaining)))
+
+        try:
+            while True:
+                env = await queues[-1].get()
+                if env is _END:
+                    break
+                yield env.index, env.source, (
+                    env.error if env.error is not None else env.value
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for stage, queue in zip(self.stages, queues):
+                stage.metrics.inputs.discard(queue)
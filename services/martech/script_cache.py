@@ -0,0 +1,229 @@
+"""Cross-site cache for third-party script bodies.
+
+Popular bundles (``analytics.js``, ``gtm.js``, Segment, Adobe Launch) are
+loaded by many of the sites we analyse. Bodies are cached by absolute URL,
+honouring ``Cache-Control``/``Expires`` freshness and revalidating stale
+entries with ``ETag``/``Last-Modified``. The cache is bounded by total body
+size with least-recently-used eviction. Callers may cap the size of the body
+they accept; downloads are abandoned as soon as they pass the cap.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Mapping
+
+import httpx
+
+Fetcher = Callable[
+    [httpx.AsyncClient, str],
+    Awaitable[tuple[str, dict[str, str], dict[str, str]]],
+]
+
+# Upper bound for heuristic freshness derived from Last-Modified.
+MAX_HEURISTIC_TTL = 24 * 60 * 60
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(s-maxage|max-age)\s*=\s*\"?(\d+)", re.I)
+
+
+class ScriptTooLarge(Exception):
+    """Raised when a script body is larger than the caller accepts."""
+
+
+async def read_text(response: httpx.Response, limit: int | None = None) -> str:
+    """Return the decoded body of the streamed ``response``.
+
+    Raises :class:`ScriptTooLarge` once more than ``limit`` characters have
+    arrived, so the rest of the body is never downloaded.
+    """
+    chunks: list[str] = []
+    size = 0
+    async for chunk in response.aiter_text():
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise ScriptTooLarge(f"body exceeds {limit} characters")
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+@dataclass
+class ScriptEntry:
+    body: str
+    expires: float
+    etag: str | None = None
+    last_modified: str | None = None
+    # Freshness lifetime of the stored response, reused by revalidations
+    # whose 304 carries no freshness headers of its own.
+    lifetime: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+def _parse_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness(headers: Mapping[str, str], now: float) -> float | None:
+    """Return how long a response may be served without revalidation.
+
+    ``None`` means the response must not be stored at all.
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    directives = {d.strip().split("=")[0] for d in cache_control.split(",")}
+    if "no-store" in directives or "private" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    age = 0.0
+    try:
+        age = float(headers.get("age", 0))
+    except ValueError:
+        pass
+    ages = dict(
+        (name.lower(), int(value)) for name, value in _MAX_AGE.findall(cache_control)
+    )
+    if ages:
+        lifetime = ages["s-maxage"] if "s-maxage" in ages else ages["max-age"]
+        return max(lifetime - age, 0.0)
+    expires = _parse_date(headers.get("expires"))
+    if expires is not None:
+        date = _parse_date(headers.get("date")) or now
+        return max(expires - date - age, 0.0)
+    last_modified = _parse_date(headers.get("last-modified"))
+    if last_modified is not None:
+        date = _parse_date(headers.get("date")) or now
+        return min(max((date - last_modified) / 10, 0.0), MAX_HEURISTIC_TTL)
+    return 0.0
+
+
+def _within(body: str, limit: int | None) -> str:
+    if limit is not None and len(body) > limit:
+        raise ScriptTooLarge(f"body exceeds {limit} characters")
+    return body
+
+
+class ScriptCache:
+    """LRU cache of script bodies keyed by absolute URL."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, ScriptEntry] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> ScriptEntry | None:
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    def store(self, url: str, body: str, headers: Mapping[str, str]) -> None:
+        """Cache ``body`` for ``url`` if ``headers`` allow it."""
+        now = time.time()
+        ttl = freshness(headers, now)
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        self.discard(url)
+        if ttl is None or (ttl <= 0 and not (etag or last_modified)):
+            return
+        entry = ScriptEntry(body, now + ttl, etag, last_modified, ttl)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[url] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def discard(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    async def fetch(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        fetcher: Fetcher,
+        limit: int | None = None,
+    ) -> str:
+        """Return the body of ``url``, using the cache where possible.
+
+        Fresh entries are served directly. Stale entries with validators are
+        revalidated with a conditional GET; a ``304`` keeps the cached body.
+        Everything else is downloaded through ``fetcher``, which should stop
+        reading past ``limit`` characters. Raises :class:`ScriptTooLarge` if
+        the body is longer than ``limit``.
+        """
+        entry = self.get(url)
+        now = time.time()
+        if entry is not None and entry.expires > now:
+            self.hits += 1
+            self.bytes_saved += entry.size
+            return _within(entry.body, limit)
+        if entry is not None:
+            conditional: dict[str, str] = {}
+            if entry.etag:
+                conditional["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                conditional["If-Modified-Since"] = entry.last_modified
+            async with client.stream(
+                "GET", url, headers=conditional, follow_redirects=True
+            ) as r:
+                headers = {k.lower(): v for k, v in r.headers.items()}
+                if r.status_code == 304:
+                    self.hits += 1
+                    self.revalidations += 1
+                    self.bytes_saved += entry.size
+                    if "cache-control" in headers or "expires" in headers:
+                        entry.lifetime = freshness(headers, now) or 0.0
+                    entry.expires = now + entry.lifetime
+                    entry.etag = headers.get("etag", entry.etag)
+                    entry.last_modified = headers.get(
+                        "last-modified", entry.last_modified
+                    )
+                    return _within(entry.body, limit)
+                r.raise_for_status()
+                self.misses += 1
+                body = await read_text(r, limit)
+            self.store(url, body, headers)
+            return body
+        self.misses += 1
+        body, headers, _ = await fetcher(client, url)
+        self.store(url, body, headers)
+        return _within(body, limit)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+            "bytes_saved": self.bytes_saved,
+        }
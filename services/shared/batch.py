@@ -0,0 +1,62 @@
+# SPDX-License-Identifier: MIT
+"""Helpers for batch endpoints that stream NDJSON results."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator, Awaitable, Callable, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+_DONE = object()
+
+
+def ndjson_line(obj: Any) -> str:
+    """Return ``obj`` encoded as one NDJSON line."""
+    return json.dumps(obj, separators=(",", ":"), default=str) + "\n"
+
+
+async def map_unordered(
+    items: Sequence[T],
+    fn: Callable[[T], Awaitable[R]],
+    concurrency: int,
+) -> AsyncGenerator[tuple[int, T, R | BaseException], None]:
+    """Yield ``(index, item, result)`` for ``fn(item)`` as each call completes.
+
+    At most ``concurrency`` calls run at once. Exceptions raised by ``fn`` are
+    yielded in place of the result. Closing the iterator early (for example
+    when a streaming client disconnects) cancels the remaining work.
+    """
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    pending = iter(enumerate(items))
+
+    async def worker() -> None:
+        try:
+            for index, item in pending:
+                try:
+                    result: R | BaseException = await fn(item)
+                except Exception as exc:  # noqa: BLE001
+                    result = exc
+                await queue.put((index, item, result))
+        finally:
+            await queue.put(_DONE)
+
+    workers = [
+        asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))
+    ]
+    running = len(workers)
+    try:
+        while running:
+            entry = await queue.get()
+            if entry is _DONE:
+                running -= 1
+                continue
+            yield entry
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,145 @@
+# SPDX-License-Identifier: MIT
+"""Single-pass extraction of the HTML elements used for detection."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+
+# Parser used by :func:`parse_document`: ``fast`` streams tags through
+# ``html.parser`` without building a tree, ``bs4`` uses BeautifulSoup.
+HTML_PARSER = os.getenv("HTML_PARSER", "fast").strip().lower()
+
+
+@dataclass
+class PageDocument:
+    """Elements of a fetched page that detection cares about.
+
+    Produced once per fetched body by :func:`parse_document` and shared by
+    script extraction, vendor detection and resource hint collection.
+    """
+
+    script_srcs: list[str] = field(default_factory=list)
+    inline_scripts: list[str] = field(default_factory=list)
+    resource_hints: list[str] = field(default_factory=list)
+    images: list[str] = field(default_factory=list)
+    srcsets: list[str] = field(default_factory=list)
+
+    def hint_urls(self) -> set[str]:
+        """Return URLs from resource hint links, images and sources."""
+        return {*self.resource_hints, *self.images, *self.srcsets}
+
+
+_TAGS = ["script", "link", "img", "source"]
+
+
+def _srcset_urls(value: str) -> list[str]:
+    urls = []
+    for part in value.split(","):
+        val = part.strip().split(" ")[0]
+        if val:
+            urls.append(val)
+    return urls
+
+
+class _TagExtractor(HTMLParser):
+    """Collect :class:`PageDocument` fields while tokenizing, without a tree."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.doc = PageDocument()
+        self._script: list[str] | None = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag not in _TAGS:
+            return
+        values = {k: v or "" for k, v in attrs}
+        if tag == "script":
+            src = values.get("src")
+            if src:
+                self.doc.script_srcs.append(src)
+            else:
+                self._script = []
+        elif tag == "link":
+            rel = values.get("rel", "").split()
+            if any(r in {"preconnect", "dns-prefetch"} for r in rel):
+                href = values.get("href")
+                if href:
+                    self.doc.resource_hints.append(href)
+        elif tag == "img":
+            src = values.get("src")
+            if src:
+                self.doc.images.append(src)
+        elif tag == "source":
+            srcset = values.get("srcset") or values.get("src")
+            if srcset:
+                self.doc.srcsets.extend(_srcset_urls(srcset))
+
+    def handle_data(self, data: str) -> None:
+        if self._script is not None:
+            self._script.append(data)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "script" and self._script is not None:
+            text = "".join(self._script)
+            if text:
+                self.doc.inline_scripts.append(text)
+            self._script = None
+
+
+def _parse_fast(html: str) -> PageDocument:
+    parser = _TagExtractor()
+    parser.feed(html)
+    parser.close()
+    # An unterminated inline script still counts, as it does for bs4.
+    parser.handle_endtag("script")
+    return parser.doc
+
+
+def _parse_bs4(html: str) -> PageDocument:
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer(_TAGS))
+    doc = PageDocument()
+    for tag in soup.find_all(_TAGS):
+        name = tag.name
+        if name == "script":
+            src = tag.get("src")
+            if src:
+                doc.script_srcs.append(src)
+            else:
+                text = tag.string
+                if text:
+                    doc.inline_scripts.append(str(text))
+        elif name == "link":
+            rel = tag.get("rel", [])
+            if isinstance(rel, str):
+                rel = [rel]
+            if any(r in {"preconnect", "dns-prefetch"} for r in rel):
+                href = tag.get("href")
+                if href:
+                    doc.resource_hints.append(href)
+        elif name == "img":
+            src = tag.get("src")
+            if src:
+                doc.images.append(src)
+        elif name == "source":
+            srcset = tag.get("srcset") or tag.get("src")
+            if srcset:
+                doc.srcsets.extend(_srcset_urls(srcset))
+    return doc
+
+
+def parse_document(html: str, parser: str | None = None) -> PageDocument:
+    """Parse ``html`` once and return its :class:`PageDocument`.
+
+    ``parser`` selects the implementation and defaults to ``HTML_PARSER``.
+    ``fast`` tokenizes with :class:`html.parser.HTMLParser` and only looks at
+    ``<script>``, ``<link>``, ``<img>`` and ``<source>`` elements; ``bs4``
+    builds a BeautifulSoup tree restricted to those elements. Both produce
+    the same document.
+    """
+    if (parser or HTML_PARSER) == "bs4":
+        return _parse_bs4(html)
+    return _parse_fast(html)
@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: MIT
+"""Domain suffix matching for host based fingerprints."""
+
+from __future__ import annotations
+
+import re
+from typing import Generic, Iterator, TypeVar
+
+from .prefilter import sre_parse
+
+T = TypeVar("T")
+
+_DOMAIN = re.compile(r"^[a-z0-9-]+(\.[a-z0-9-]+)+$")
+
+
+def _literal(items: list) -> str | None:
+    chars = []
+    for op, av in items:
+        if op is not sre_parse.LITERAL:
+            return None
+        chars.append(chr(av))
+    return "".join(chars)
+
+
+def domain_suffixes(pattern: str) -> frozenset[str] | None:
+    """Return the domains named by ``pattern`` if it is a plain domain list.
+
+    ``cdn\\.segment\\.com`` and ``a\\.com|b\\.net`` qualify. Patterns using any
+    other regex construct return ``None`` and must be evaluated as regexes.
+    """
+    try:
+        parsed = list(sre_parse.parse(pattern))
+    except Exception:  # noqa: BLE001
+        return None
+    if len(parsed) == 1 and parsed[0][0] is sre_parse.BRANCH:
+        branches = [list(b) for b in parsed[0][1][1]]
+    else:
+        branches = [parsed]
+    domains = set()
+    for branch in branches:
+        literal = _literal(branch)
+        if literal is None:
+            return None
+        literal = literal.lower()
+        if not _DOMAIN.match(literal):
+            return None
+        domains.add(literal)
+    return frozenset(domains)
+
+
+class _Node(Generic[T]):
+    __slots__ = ("children", "values")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node[T]] = {}
+        self.values: list[T] = []
+
+
+class DomainTrie(Generic[T]):
+    """Map domains to values, matching a domain and all of its subdomains.
+
+    Labels are stored in reverse (``com`` → ``segment`` → ``cdn``) so a
+    lookup walks the host once regardless of how many domains are stored.
+    """
+
+    def __init__(self) -> None:
+        self._root: _Node[T] = _Node()
+        self.size = 0
+
+    def add(self, domain: str, value: T) -> None:
+        node = self._root
+        for label in reversed(domain.lower().strip(".").split(".")):
+            node = node.children.setdefault(label, _Node())
+        node.values.append(value)
+        self.size += 1
+
+    def lookup(self, host: str) -> Iterator[T]:
+        """Yield values stored for ``host`` or any of its parent domains."""
+        node = self._root
+        for label in reversed(host.lower().strip(".").split(".")):
+            child = node.children.get(label)
+            if child is None:
+                return
+            node = child
+            yield from node.values
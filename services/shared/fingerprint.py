@@ -3,14 +3,21 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import re
-from functools import lru_cache
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from pathlib import Path
 from typing import Any, Iterable, Mapping, Sequence
+from urllib.parse import urlparse
 
 import yaml  # type: ignore
 
+from .domains import DomainTrie, domain_suffixes
+from .prefilter import LiteralScanner, required_literals
+
 
 @lru_cache(maxsize=None)
 def load_fingerprints(path: Path) -> dict:
@@ -33,7 +40,7 @@ def load_fingerprints(path: Path) -> dict:
     return data
 
 
-_PATTERN_TYPES = {
+_PATTERN_TYPES = (
     "html",
     "path",
     "hostname",
@@ -44,7 +51,20 @@ _PATTERN_TYPES = {
     "response_body",
     "asset_host",
     "api_host",
-}
+)
+
+# Matcher types evaluated against the page body; these share a literal
+# prefilter so most regexes never have to scan the document.
+_BODY_TYPES = ("html", "response_body")
+
+# Matcher types evaluated against the hostnames of resource URLs.
+_HOST_TYPES = ("asset_host", "api_host")
+
+# Upper bound on memoized header name -> matchers resolutions.
+_HEADER_NAME_CACHE_SIZE = 4096
+
+# Header names containing any of these characters are treated as regexes.
+_REGEX_CHARS = re.compile(r"[.\\^$|?*+()[{]")
 
 
 def _iter_vendors(data: Mapping[str, Any]) -> Iterable[dict]:
@@ -64,18 +84,398 @@ def _iter_vendors(data: Mapping[str, Any]) -> Iterable[dict]:
                         yield v
 
 
+class PageModel:
+    """Pre-processed view of a fetched page shared by every fingerprint set.
+
+    Headers and cookies are lower-cased, resource URLs deduplicated and parsed
+    and text is case-folded for literal scanning once per page, however many
+    fingerprint sets are evaluated against it.
+    """
+
+    def __init__(
+        self,
+        html: str = "",
+        url: str = "",
+        headers: Mapping[str, str] | None = None,
+        cookies: Mapping[str, str] | None = None,
+        resource_urls: Iterable[str] | None = None,
+        script_bodies: Iterable[str] | None = None,
+    ) -> None:
+        self.html = html or ""
+        self.url = url or ""
+        self.headers = {k.lower(): v for k, v in (headers or {}).items()}
+        self.cookies = {k.lower(): v for k, v in (cookies or {}).items()}
+        self.resource_urls = list(dict.fromkeys(resource_urls or []))
+        self.script_bodies = [body for body in script_bodies or [] if body]
+
+        parsed = urlparse(self.url)
+        self.hostname = parsed.hostname or ""
+        self.path = parsed.path or ""
+
+    @cached_property
+    def hosts(self) -> set[str]:
+        hosts: set[str] = set()
+        for u in self.resource_urls:
+            try:
+                hosts.add(urlparse(u).hostname or "")
+            except ValueError:
+                continue
+        return hosts
+
+    @cached_property
+    def folded_html(self) -> str:
+        return self.html.casefold()
+
+    @cached_property
+    def script_digests(self) -> list[str]:
+        return [
+            hashlib.blake2b(
+                body.encode("utf-8", "surrogatepass"), digest_size=16
+            ).hexdigest()
+            for body in self.script_bodies
+        ]
+
+    @cached_property
+    def folded_urls(self) -> str:
+        return "\n".join(self.resource_urls).casefold()
+
+
+@dataclass(frozen=True)
+class CompiledVendor:
+    name: str
+    category: str
+    threshold: Any
+
+
+@dataclass(frozen=True)
+class CompiledMatcher:
+    index: int
+    vendor: int
+    type: str
+    pattern: str | None
+    regex: re.Pattern[str] | None
+    name: str | None
+    name_regex: re.Pattern[str] | None
+    weight: float
+    evidence: str
+    literals: frozenset[str] | None = None
+
+
+class CompiledFingerprints:
+    """Fingerprint definitions prepared once for repeated matching.
+
+    Patterns are compiled, weights and thresholds resolved and matchers grouped
+    by type when the object is created, so :meth:`match` only evaluates
+    precompiled regexes against the page. Body and script URL patterns
+    additionally record the literals they require; the page is scanned for all
+    of them at once and a regex only runs when one of its literals is present.
+    Host patterns that are plain domain names are resolved through a
+    :class:`~services.shared.domains.DomainTrie` and match the domain and its
+    subdomains; any other host pattern is evaluated as a regex. Cookie and
+    header matchers are indexed by name so each cookie and header of a
+    response is visited once and only matchers for present names run.
+    """
+
+    def __init__(self, data: Mapping[str, Any]) -> None:
+        scoring = data.get("scoring") or {}
+        default_threshold = data.get("default_threshold", 1)
+        self.data = data
+        # Identifies the definitions so derived results can be cached safely.
+        self.version = hashlib.sha256(
+            json.dumps(data, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+
+        self.vendors: list[CompiledVendor] = []
+        self.matchers: dict[str, list[CompiledMatcher]] = {
+            t: [] for t in _PATTERN_TYPES
+        }
+        self.host_trie: DomainTrie[CompiledMatcher] = DomainTrie()
+        self.host_regexes: list[CompiledMatcher] = []
+        self.cookie_index: dict[str, list[CompiledMatcher]] = {}
+        self.header_index: dict[str, list[CompiledMatcher]] = {}
+        self.header_patterns: list[CompiledMatcher] = []
+        self._header_names: dict[str, list[CompiledMatcher]] = {}
+        position = 0
+
+        for vendor in _iter_vendors(data):
+            name = vendor.get("name")
+            if not name:
+                continue
+            index = len(self.vendors)
+            self.vendors.append(
+                CompiledVendor(
+                    name=name,
+                    category=vendor.get("category", "uncategorized"),
+                    threshold=vendor.get("threshold", default_threshold),
+                )
+            )
+            for matcher in vendor.get("matchers", []):
+                m_type = matcher.get("type") or matcher.get("kind")
+                if m_type not in _PATTERN_TYPES:
+                    continue
+                pattern = matcher.get("pattern")
+                name_key = matcher.get("name")
+                name_regex = None
+                if m_type == "response_header" and name_key:
+                    if _REGEX_CHARS.search(name_key):
+                        name_regex = re.compile(name_key, re.I)
+                if m_type == "response_header" and name_key:
+                    evidence = f"{name_key}:{pattern}"
+                elif m_type == "cookie" and name_key:
+                    evidence = name_key
+                else:
+                    evidence = pattern or ""
+                literals = None
+                if pattern and (m_type in _BODY_TYPES or m_type == "script_url"):
+                    literals = required_literals(pattern)
+                compiled = CompiledMatcher(
+                    index=position,
+                    vendor=index,
+                    type=m_type,
+                    pattern=pattern,
+                    regex=re.compile(pattern, re.I) if pattern else None,
+                    name=name_key,
+                    name_regex=name_regex,
+                    weight=float(matcher.get("weight", scoring.get(m_type, 1))),
+                    evidence=evidence,
+                    literals=literals,
+                )
+                position += 1
+                self.matchers[m_type].append(compiled)
+                if m_type == "cookie" and name_key:
+                    self.cookie_index.setdefault(name_key.lower(), []).append(
+                        compiled
+                    )
+                elif m_type == "response_header" and name_key:
+                    if name_regex is None:
+                        self.header_index.setdefault(name_key.lower(), []).append(
+                            compiled
+                        )
+                    else:
+                        self.header_patterns.append(compiled)
+                if m_type in _HOST_TYPES and pattern:
+                    domains = domain_suffixes(pattern)
+                    if domains is None:
+                        self.host_regexes.append(compiled)
+                    else:
+                        for domain in domains:
+                            self.host_trie.add(domain, compiled)
+
+        self.body_scanner = LiteralScanner(
+            lit
+            for m_type in _BODY_TYPES
+            for m in self.matchers[m_type]
+            for lit in m.literals or ()
+        )
+        self.url_scanner = LiteralScanner(
+            lit for m in self.matchers["script_url"] for lit in m.literals or ()
+        )
+
+    def _body_hits(self, text: str, folded: str) -> frozenset[int]:
+        """Return indexes of body matchers that match ``text``."""
+        present = self.body_scanner.scan_folded(folded)
+        hits = set()
+        for m_type in _BODY_TYPES:
+            for m in self.matchers[m_type]:
+                if m.regex is None:
+                    continue
+                if m.literals is not None and m.literals.isdisjoint(present):
+                    continue
+                if m.regex.search(text):
+                    hits.add(m.index)
+        return frozenset(hits)
+
+    def _header_matchers(self, name: str) -> list[CompiledMatcher]:
+        """Return matchers whose header name matches lower-cased ``name``."""
+        found = self._header_names.get(name)
+        if found is None:
+            found = list(self.header_index.get(name, ()))
+            found.extend(
+                m
+                for m in self.header_patterns
+                if m.name_regex is not None and m.name_regex.search(name)
+            )
+            found.sort(key=lambda m: m.index)
+            # Header names repeat across responses; keep the memo bounded in
+            # case a site sends randomized names.
+            if len(self._header_names) >= _HEADER_NAME_CACHE_SIZE:
+                self._header_names.clear()
+            self._header_names[name] = found
+        return found
+
+    def match(
+        self,
+        html: str,
+        url: str,
+        headers: Mapping[str, str] | None,
+        cookies: Mapping[str, str] | None,
+        resource_urls: Sequence[str] | None,
+    ) -> dict[str, dict[str, Any]]:
+        """Return detected vendors grouped by category.
+
+        See :func:`match_fingerprints` for the meaning of the arguments.
+        """
+        return self.match_page(PageModel(html, url, headers, cookies, resource_urls))
+
+    def match_page(
+        self, page: PageModel, *, include_scripts: bool = True
+    ) -> dict[str, dict[str, Any]]:
+        """Return detected vendors for ``page`` grouped by category.
+
+        Body patterns are matched against the page HTML and, when
+        ``include_scripts`` is true, against each of ``page.script_bodies``.
+        """
+        scores = [0.0] * len(self.vendors)
+        evidence: dict[int, dict[str, list[str]]] = {}
+
+        def hit(m: CompiledMatcher) -> None:
+            # Each successful matcher contributes its weight to the vendor.
+            # Scores accumulate until the configured threshold is reached.
+            scores[m.vendor] += m.weight
+            evidence.setdefault(m.vendor, {}).setdefault(m.type, []).append(
+                m.evidence
+            )
+
+        body_hits = self._body_hits(page.html, page.folded_html)
+        if include_scripts:
+            # Popular bundles recur across sites, so per-script results are
+            # memoized by content digest and fingerprint version.
+            for body, digest in zip(page.script_bodies, page.script_digests):
+                key = (self.version, digest)
+                cached = _script_matches.get(key)
+                if cached is None:
+                    _script_match_stats["misses"] += 1
+                    cached = self._body_hits(body, body.casefold())
+                    _script_matches[key] = cached
+                    while len(_script_matches) > SCRIPT_MATCH_CACHE_SIZE:
+                        _script_matches.popitem(last=False)
+                else:
+                    _script_match_stats["hits"] += 1
+                    _script_matches.move_to_end(key)
+                body_hits |= cached
+        for m_type in _BODY_TYPES:
+            for m in self.matchers[m_type]:
+                if m.index in body_hits:
+                    hit(m)
+
+        for m_type, text in (
+            ("path", page.path),
+            ("hostname", page.hostname),
+            ("url", page.url),
+        ):
+            for m in self.matchers[m_type]:
+                if m.regex and m.regex.search(text):
+                    hit(m)
+
+        # Script URL regexes are prefiltered on the joined URL text and host
+        # matchers are resolved per unique host rather than per matcher.
+        present = self.url_scanner.scan_folded(page.folded_urls)
+        for m in self.matchers["script_url"]:
+            if m.regex is None:
+                continue
+            if m.literals is not None and m.literals.isdisjoint(present):
+                continue
+            if any(m.regex.search(u) for u in page.resource_urls):
+                hit(m)
+
+        host_hits: dict[int, CompiledMatcher] = {}
+        for host in page.hosts:
+            for m in self.host_trie.lookup(host):
+                host_hits[m.index] = m
+        for m in self.host_regexes:
+            if m.regex and any(m.regex.search(host) for host in page.hosts):
+                host_hits[m.index] = m
+        for index in sorted(host_hits):
+            hit(host_hits[index])
+
+        # Headers and cookies are each visited once; only matchers indexed
+        # under a present name are evaluated.
+        named_hits: dict[int, CompiledMatcher] = {}
+        for h_name, h_value in page.headers.items():
+            for m in self._header_matchers(h_name):
+                if m.index in named_hits:
+                    continue
+                if m.regex is None or m.regex.search(h_value):
+                    named_hits[m.index] = m
+
+        for c_name, c_value in page.cookies.items():
+            if not c_value:
+                continue
+            for m in self.cookie_index.get(c_name, ()):
+                if m.regex is None or m.regex.search(c_value):
+                    named_hits[m.index] = m
+
+        for index in sorted(named_hits):
+            hit(named_hits[index])
+
+        results: dict[str, dict[str, Any]] = {}
+        for index, vendor in enumerate(self.vendors):
+            # Once the cumulative score meets or exceeds the threshold the
+            # vendor is considered present. Confidence is capped at 1.0.
+            score = scores[index]
+            if score >= vendor.threshold:
+                confidence = round(min(score / float(vendor.threshold), 1.0), 2)
+                results.setdefault(vendor.category, {})[vendor.name] = {
+                    "confidence": confidence,
+                    "evidence": evidence.get(index, {}),
+                }
+        return results
+
+
+# Body matcher hits per external script, keyed by fingerprint version and
+# script content digest.
+SCRIPT_MATCH_CACHE_SIZE = 4096
+_script_matches: OrderedDict[tuple[str, str], frozenset[int]] = OrderedDict()
+_script_match_stats = {"hits": 0, "misses": 0}
+
+
+def script_match_stats() -> dict[str, int]:
+    """Return hit/miss counters of the per-script match memo."""
+    return {"entries": len(_script_matches), **_script_match_stats}
+
+
+_COMPILED_CACHE_SIZE = 32
+_compiled: OrderedDict[int, tuple[Mapping[str, Any], CompiledFingerprints]] = (
+    OrderedDict()
+)
+
+
+def compile_fingerprints(
+    fingerprints: Mapping[str, Any] | CompiledFingerprints,
+) -> CompiledFingerprints:
+    """Return a :class:`CompiledFingerprints` for ``fingerprints``.
+
+    Results are memoized per definitions object so repeated calls with the
+    output of :func:`load_fingerprints` only compile the patterns once.
+    """
+    if isinstance(fingerprints, CompiledFingerprints):
+        return fingerprints
+    key = id(fingerprints)
+    entry = _compiled.get(key)
+    if entry is not None and entry[0] is fingerprints:
+        _compiled.move_to_end(key)
+        return entry[1]
+    compiled = CompiledFingerprints(fingerprints)
+    _compiled[key] = (fingerprints, compiled)
+    while len(_compiled) > _COMPILED_CACHE_SIZE:
+        _compiled.popitem(last=False)
+    return compiled
+
+
 def match_fingerprints(
     html: str,
     url: str,
     headers: Mapping[str, str] | None,
     cookies: Mapping[str, str] | None,
     resource_urls: Sequence[str] | None,
-    fingerprints: Mapping[str, Any],
+    fingerprints: Mapping[str, Any] | CompiledFingerprints,
 ) -> dict[str, dict[str, Any]]:
     """Return detected vendors grouped by category.
 
     ``resource_urls`` should include any discovered asset or script URLs.
     ``headers`` and ``cookies`` are case-insensitive mappings.
+    ``fingerprints`` may be raw definitions as returned by
+    :func:`load_fingerprints` or a :class:`CompiledFingerprints` instance.
 
     The scoring system is additive: each matcher that succeeds contributes its
     ``weight`` toward the vendor's cumulative score. When the score meets or
@@ -83,120 +483,38 @@ def match_fingerprints(
     the vendor is reported as detected. Confidence is normalized so a score
     equal to the threshold yields ``1.0``.
     """
+    return compile_fingerprints(fingerprints).match(
+        html, url, headers, cookies, resource_urls
+    )
 
-    headers = {k.lower(): v for k, v in (headers or {}).items()}
-    cookies = {k.lower(): v for k, v in (cookies or {}).items()}
-    resource_urls = list(resource_urls or [])
 
-    from urllib.parse import urlparse
+@dataclass(frozen=True)
+class FingerprintSet:
+    """A named set of fingerprints evaluated by :func:`detect_all`.
 
-    parsed = urlparse(url)
-    hostname = parsed.hostname or ""
-    path = parsed.path or ""
-
-    scoring = fingerprints.get("scoring", {})
-    default_threshold = fingerprints.get("default_threshold", 1)
+    ``include_scripts`` controls whether body patterns also see the page's
+    external script bodies or only its HTML.
+    """
 
-    results: dict[str, dict[str, Any]] = {}
+    name: str
+    fingerprints: Mapping[str, Any] | CompiledFingerprints
+    include_scripts: bool = True
 
-    for vendor in _iter_vendors(fingerprints):
-        name = vendor.get("name")
-        if not name:
-            continue
-        category = vendor.get("category", "uncategorized")
-        threshold = vendor.get("threshold", default_threshold)
 
-        evidence: dict[str, list[str]] = {k: [] for k in _PATTERN_TYPES}
-        score = 0.0
+def detect_all(
+    page: PageModel, sets: Iterable[FingerprintSet]
+) -> dict[str, dict[str, dict[str, Any]]]:
+    """Evaluate every fingerprint set against one shared ``page``.
 
-        for matcher in vendor.get("matchers", []):
-            m_type = matcher.get("type") or matcher.get("kind")
-            if m_type not in _PATTERN_TYPES:
-                continue
-            pattern = matcher.get("pattern")
-            name_key = matcher.get("name")
-            rx = re.compile(pattern, re.I) if pattern else None
-            weight = float(matcher.get("weight", scoring.get(m_type, 1)))
-
-            matched = False
-            if m_type == "html" and rx and rx.search(html):
-                matched = True
-            elif m_type == "path" and rx and rx.search(path):
-                matched = True
-            elif m_type == "hostname" and rx and rx.search(hostname):
-                matched = True
-            elif m_type == "url" and rx and rx.search(url):
-                matched = True
-            elif m_type == "script_url" and rx:
-                for u in resource_urls:
-                    if rx.search(u):
-                        matched = True
-                        break
-            elif m_type == "response_header" and name_key:
-                # Header names may be provided as a regex (e.g. "X-A|X-B").
-                # If no regex characters are present we keep the fast direct
-                # lookup path. Otherwise every response header is scanned for a
-                # name match and the optional value regex is applied.
-                if re.search(r"[.\\^$|?*+()[{]", name_key):
-                    name_rx = re.compile(name_key, re.I)
-                    for h_name, h_value in headers.items():
-                        if name_rx.search(h_name):
-                            if rx:
-                                if rx.search(h_value):
-                                    matched = True
-                                    break
-                            else:
-                                matched = True
-                                break
-                else:
-                    value = headers.get(name_key.lower())
-                    if value is not None:
-                        if rx:
-                            if rx.search(value):
-                                matched = True
-                        else:
-                            matched = True
-            elif m_type == "cookie" and name_key:
-                value = cookies.get(name_key.lower(), "")
-                if value:
-                    if rx:
-                        if rx.search(value):
-                            matched = True
-                    else:
-                        matched = True
-            elif m_type == "response_body" and rx and rx.search(html):
-                matched = True
-            elif m_type in {"asset_host", "api_host"} and rx:
-                for u in resource_urls:
-                    host = urlparse(u).hostname or ""
-                    if rx.search(host):
-                        matched = True
-                        break
-
-            if matched:
-                # Each successful matcher contributes its weight to the vendor.
-                # Scores accumulate until the configured threshold is reached.
-                score += weight
-                key = m_type
-                if m_type == "response_header" and name_key:
-                    evidence[key].append(f"{name_key}:{pattern}")
-                elif m_type == "cookie" and name_key:
-                    evidence[key].append(name_key)
-                else:
-                    evidence[key].append(pattern or "")
-
-        # Once the cumulative score meets or exceeds the threshold the vendor
-        # is considered present. Confidence is capped at 1.0.
-        if score >= threshold:
-            confidence = round(min(score / float(threshold), 1.0), 2)
-            if category not in results:
-                results[category] = {}
-            results[category][name] = {
-                "confidence": confidence,
-                "evidence": {k: v for k, v in evidence.items() if v},
-            }
-
-    return results
+    Returns the :func:`match_fingerprints` result of each set keyed by its
+    name.
+    """
+    return {
+        fp_set.name: compile_fingerprints(fp_set.fingerprints).match_page(
+            page, include_scripts=fp_set.include_scripts
+        )
+        for fp_set in sets
+    }
 
 
 # Default fingerprints loaded once per process
@@ -0,0 +1,105 @@
+# SPDX-License-Identifier: MIT
+"""Literal prefiltering for fingerprint regexes.
+
+Most fingerprint patterns can only match when some fixed string is present in
+the document (``gtag\\(`` needs ``gtag(``). :func:`required_literals` extracts
+such strings from a pattern and :class:`LiteralScanner` reports which of them
+occur in a document, so the full regex only runs for candidate patterns.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+try:  # Python 3.11+
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse  # type: ignore[no-redef]
+
+# Literals shorter than this occur on nearly every page and are not worth it.
+MIN_LITERAL_LENGTH = 3
+
+_REPEATS = {
+    sre_parse.MAX_REPEAT,
+    sre_parse.MIN_REPEAT,
+    getattr(sre_parse, "POSSESSIVE_REPEAT", sre_parse.MAX_REPEAT),
+}
+
+
+def _selectivity(literals: frozenset[str]) -> tuple[int, int]:
+    return min(len(lit) for lit in literals), -len(literals)
+
+
+def _required(items: Any) -> frozenset[str] | None:
+    """Return strings one of which every match of ``items`` must contain."""
+    best: frozenset[str] | None = None
+    run: list[str] = []
+
+    def consider(candidate: frozenset[str] | None) -> None:
+        nonlocal best
+        if not candidate:
+            return
+        if best is None or _selectivity(candidate) > _selectivity(best):
+            best = candidate
+
+    def flush() -> None:
+        if run:
+            consider(frozenset(["".join(run)]))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            consider(_required(av[-1]))
+        elif op is sre_parse.BRANCH:
+            branches = [_required(branch) for branch in av[1]]
+            if branches and all(branches):
+                consider(frozenset().union(*branches))  # type: ignore[arg-type]
+        elif op in _REPEATS and av[0] >= 1:
+            consider(_required(av[2]))
+    flush()
+    return best
+
+
+def required_literals(pattern: str) -> frozenset[str] | None:
+    """Return literals one of which must occur for ``pattern`` to match.
+
+    The result is case-folded, matching patterns compiled with ``re.I``.
+    ``None`` means no sufficiently long literal could be extracted and the
+    pattern has to be evaluated against every document.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:  # noqa: BLE001
+        return None
+    literals = _required(parsed)
+    if not literals or min(len(lit) for lit in literals) < MIN_LITERAL_LENGTH:
+        return None
+    return frozenset(lit.casefold() for lit in literals)
+
+
+class LiteralScanner:
+    """Report which of a fixed set of literals occur in a document.
+
+    The document is case-folded once and every literal is then located with
+    ``str.__contains__``, which runs in C and outperforms a pure Python
+    multi-pattern automaton on multi-megabyte pages.
+    """
+
+    def __init__(self, literals: Iterable[str]) -> None:
+        self.literals = tuple(sorted({lit.casefold() for lit in literals}))
+
+    def scan(self, text: str) -> set[str]:
+        """Return the literals that occur in ``text``."""
+        if not self.literals or not text:
+            return set()
+        return self.scan_folded(text.casefold())
+
+    def scan_folded(self, folded: str) -> set[str]:
+        """Like :meth:`scan` for text that was already case-folded."""
+        if not self.literals or not folded:
+            return set()
+        return {lit for lit in self.literals if lit in folded}
@@ -1,7 +1,10 @@
-from typing import Sequence
+from typing import Any, Mapping, Sequence
+from .document import PageDocument, parse_document
 from .fingerprint import (
     DEFAULT_FINGERPRINTS,
-    match_fingerprints,
+    CompiledFingerprints,
+    PageModel,
+    compile_fingerprints,
 )
 
 
@@ -33,8 +36,9 @@ def detect_vendors(
     html: str,
     cookies: dict[str, str],
     urls: Sequence[str] | None = None,
-    fingerprints: dict[str, list[dict]] | None = None,
+    fingerprints: Mapping[str, Any] | CompiledFingerprints | None = None,
     script_bodies: Sequence[str] | None = None,
+    document: PageDocument | None = None,
 ) -> dict[str, dict]:
     """Return detected analytics vendors with confidence scores and evidence.
 
@@ -42,19 +46,19 @@ def detect_vendors(
     sources, image URLs, resource hints, etc.) that should be considered when
     matching vendor host fingerprints. ``script_bodies`` may contain additional
     JavaScript text (e.g. from externally hosted scripts) which will be matched
-    against script patterns.
+    against script patterns. ``fingerprints`` may be raw definitions or a
+    :class:`~services.shared.fingerprint.CompiledFingerprints` instance.
+    Pass ``document`` when ``html`` was already parsed to avoid parsing it
+    again.
     """
-    from bs4 import BeautifulSoup
-
     if fingerprints is None:
         fingerprints = DEFAULT_FINGERPRINTS
 
-    soup = BeautifulSoup(html, "html.parser")
-    srcs = [tag.get("src") or "" for tag in soup.find_all("script") if tag.get("src")]
+    if document is None:
+        document = parse_document(html)
+    srcs = list(document.script_srcs)
     if urls:
         srcs.extend(urls)
 
-    if script_bodies:
-        html = "\n".join([html, *script_bodies])
-
-    return match_fingerprints(html, "", {}, cookies, srcs, fingerprints)
+    page = PageModel(html, "", {}, cookies, srcs, script_bodies)
+    return compile_fingerprints(fingerprints).match_page(page)
@@ -1,8 +1,12 @@
+import os
 import sys
 from pathlib import Path
 import importlib.util
 import pytest
 
+# Keep jobs in memory instead of the service's data directory.
+os.environ.setdefault("JOBS_DB_PATH", ":memory:")
+
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
@@ -0,0 +1,139 @@
+import sqlite3
+import time
+
+from services.martech.cache import AnalysisCache, SQLiteBackend, approximate_size
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_expiry_and_purge():
+    clock = Clock()
+    cache = AnalysisCache(ttl=10, max_entries=10, max_bytes=10_000, clock=clock)
+    cache.set("a", {"core": {}})
+    cache.set("b", {"core": {}})
+    assert cache.get("a") == {"core": {}}
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.purge_expired() == 1
+    assert len(cache) == 0
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expirations"] == 2
+
+
+def test_lru_eviction_by_count_and_bytes():
+    data = {"core": {"GA": 1}}
+    size = approximate_size(data)
+    cache = AnalysisCache(ttl=60, max_entries=2, max_bytes=size * 3)
+    cache.set("a", data)
+    cache.set("b", data)
+    cache.get("a")
+    cache.set("c", data)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+
+    cache.max_entries = 10
+    cache.set("d", data)
+    cache.set("e", data)
+    assert len(cache) == 3
+    assert cache.stats()["bytes"] <= size * 3
+    assert cache.stats()["evictions"] == 2
+
+    cache.set("huge", {"x": "y" * size * 4})
+    assert "huge" not in cache
+
+
+def test_stale_window():
+    clock = Clock()
+    cache = AnalysisCache(
+        ttl=10, max_entries=10, max_bytes=10_000, stale_ttl=5, clock=clock
+    )
+    cache.set("a", {"core": {}})
+    assert cache.lookup("a") == ({"core": {}}, False)
+    clock.now = 12
+    assert cache.get("a") is None
+    assert cache.lookup("a") == ({"core": {}}, True)
+    assert cache.purge_expired() == 0
+    clock.now = 16
+    assert cache.lookup("a") is None
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_sqlite_backend_shared_and_persistent(tmp_path):
+    path = tmp_path / "analysis.db"
+    clock = Clock()
+    first = AnalysisCache(
+        ttl=10, max_entries=10, max_bytes=10_000, backend=SQLiteBackend(path), clock=clock
+    )
+    first.set("a", {"core": {"GA": {"confidence": 1.0}}})
+
+    # A second process (or a restart) sees the entry through the database.
+    second = AnalysisCache(
+        ttl=10, max_entries=10, max_bytes=10_000, backend=SQLiteBackend(path), clock=clock
+    )
+    assert second.get("a") == {"core": {"GA": {"confidence": 1.0}}}
+    assert second.stats()["backend_hits"] == 1
+    assert "a" in second
+
+    clock.now = 11
+    assert second.get("a") is None
+    assert SQLiteBackend(path).get("a") is None
+
+    first.set("b", {"core": {}})
+    clock.now = 30
+    first.purge_expired()
+    assert SQLiteBackend(path).get("b") is None
+
+
+def test_expired_local_copy_falls_back_to_fresh_shared_row(tmp_path):
+    path = tmp_path / "analysis.db"
+    clock = Clock()
+    first = AnalysisCache(
+        ttl=10, max_entries=10, max_bytes=10_000, backend=SQLiteBackend(path), clock=clock
+    )
+    second = AnalysisCache(
+        ttl=10, max_entries=10, max_bytes=10_000, backend=SQLiteBackend(path), clock=clock
+    )
+    first.set("k", {"core": {"old": {}}})
+    clock.now = 11
+    second.set("k", {"core": {"new": {}}})
+
+    assert first.lookup("k") == ({"core": {"new": {}}}, False)
+    assert first.stats()["backend_hits"] == 1
+    assert SQLiteBackend(path).get("k") is not None
+
+
+def test_locked_backend_is_a_quick_miss_not_a_stall(tmp_path):
+    path = tmp_path / "analysis.db"
+    clock = Clock()
+    reader = AnalysisCache(
+        ttl=10, max_entries=10, max_bytes=10_000, backend=SQLiteBackend(path), clock=clock
+    )
+    writer = AnalysisCache(
+        ttl=10, max_entries=10, max_bytes=10_000, backend=SQLiteBackend(path), clock=clock
+    )
+    reader.set("a", {"core": {}})
+    # Another worker holds the write lock.
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        writer.set("b", {"core": {}})
+        assert time.perf_counter() - start < 1
+        assert writer.stats()["backend_busy"] == 1
+        # WAL readers are not blocked by the writer.
+        assert AnalysisCache(
+            ttl=10, max_entries=10, max_bytes=10_000, backend=SQLiteBackend(path), clock=clock
+        ).get("a") == {"core": {}}
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    writer.set("b", {"core": {}})
+    assert SQLiteBackend(path).get("b") is not None
@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+
+from services.martech.backoff import HostBackoff, classify_error, host_of
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_classify_error_and_host():
+    request = httpx.Request("GET", "https://example.com")
+    assert classify_error(httpx.ConnectTimeout("t", request=request)) == "timeout"
+    assert classify_error(asyncio.TimeoutError()) == "timeout"
+    assert classify_error(httpx.ConnectError("c", request=request)) == "connect"
+    assert classify_error(httpx.RemoteProtocolError("p", request=request)) == "other"
+    assert host_of("Example.com/path") == "example.com"
+    assert host_of("http://localhost:8080/") == "localhost:8080"
+
+
+def test_exponential_backoff_per_error_class():
+    clock = Clock()
+    backoff = HostBackoff({"connect": 10}, max_delay=35, clock=clock)
+    error = httpx.ConnectError("dns", request=httpx.Request("GET", "https://a"))
+    assert backoff.failure("a", error) == 10
+    assert backoff.blocked("a") == "connect"
+    assert backoff.blocked("b") is None
+    clock.now = 10
+    assert backoff.blocked("a") is None
+    assert backoff.failure("a", error) == 20
+    assert backoff.failure("a", error) == 35
+    assert backoff.remaining("a") == 35
+    backoff.success("a")
+    assert backoff.blocked("a") is None
+    assert backoff.stats()["skipped"] == 1
+
+
+def test_backoff_stays_capped_for_hosts_that_never_recover():
+    backoff = HostBackoff({"timeout": 60.0}, max_delay=3600, clock=Clock())
+    for _ in range(1200):
+        delay = backoff.failure("dead", httpx.ReadTimeout("slow"))
+    assert delay == 3600
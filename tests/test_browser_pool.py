@@ -0,0 +1,154 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+from services.martech.browser import BrowserPool
+
+
+class FakePage:
+    async def goto(self, *args, **kwargs):
+        pass
+
+    async def content(self):
+        return "<html></html>"
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, browser, options):
+        self.browser = browser
+        self.options = options
+        self.closed = False
+
+    async def new_page(self):
+        if not self.browser.connected:
+            raise RuntimeError("browser has been closed")
+        return FakePage()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        context = FakeContext(self, kwargs)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.browsers = []
+        self.stopped = False
+        self.firefox = self
+
+    async def launch(self, headless=True):
+        browser = FakeBrowser()
+        self.browsers.append(browser)
+        return browser
+
+    async def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    pw = FakePlaywright()
+
+    class Starter:
+        async def start(self):
+            return pw
+
+    module = types.ModuleType("playwright.async_api")
+    module.async_playwright = Starter
+    monkeypatch.setitem(sys.modules, "playwright", types.ModuleType("playwright"))
+    monkeypatch.setitem(sys.modules, "playwright.async_api", module)
+    return pw
+
+
+def test_contexts_are_reused_and_recycled(playwright):
+    pool = BrowserPool(size=1, max_pages=2, acquire_timeout=1)
+
+    async def main():
+        await pool.start("http://proxy.local")
+        for _ in range(3):
+            async with pool.page() as page:
+                await page.content()
+        await pool.stop()
+
+    asyncio.run(main())
+    [browser] = playwright.browsers
+    assert len(browser.contexts) == 2
+    assert browser.contexts[0].closed
+    assert browser.contexts[0].options == {
+        "java_script_enabled": False,
+        "proxy": {"server": "http://proxy.local"},
+    }
+    assert pool.stats()["pages"] == 3
+    assert pool.stats()["recycled"] == 1
+    assert playwright.stopped and not pool.running
+
+
+def test_acquire_times_out_when_all_contexts_busy(playwright):
+    pool = BrowserPool(size=1, max_pages=10, acquire_timeout=0.05)
+
+    async def main():
+        await pool.start()
+        async with pool.page():
+            with pytest.raises(asyncio.TimeoutError):
+                async with pool.page():
+                    pass
+        async with pool.page():
+            pass
+
+    asyncio.run(main())
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["busy"] == 0
+
+
+def test_disconnected_browser_is_relaunched(playwright):
+    pool = BrowserPool(size=1, max_pages=10, acquire_timeout=1)
+
+    async def main():
+        await pool.start()
+        async with pool.page():
+            pass
+        playwright.browsers[0].connected = False
+        async with pool.page():
+            pass
+
+    asyncio.run(main())
+    assert len(playwright.browsers) == 2
+    assert len(playwright.browsers[1].contexts) == 1
+
+
+def test_contexts_of_a_replaced_browser_are_recycled(playwright):
+    pool = BrowserPool(size=2, max_pages=10, acquire_timeout=1)
+
+    async def main():
+        await pool.start()
+        async with pool.page(), pool.page():
+            pass
+        playwright.browsers[0].connected = False
+        for _ in range(2):
+            async with pool.page():
+                pass
+
+    asyncio.run(main())
+    assert len(playwright.browsers) == 2
+    assert len(playwright.browsers[1].contexts) == 2
+    assert pool.stats()["recycled"] == 2
@@ -4,7 +4,12 @@ import httpx
 import copy
 import services.martech.app
 
-from services.shared.fingerprint import load_fingerprints, match_fingerprints
+from services.shared.fingerprint import (
+    CompiledFingerprints,
+    compile_fingerprints,
+    load_fingerprints,
+    match_fingerprints,
+)
 
 CMS_FP = load_fingerprints(
     Path(__file__).resolve().parents[1] / "cms_fingerprints.yaml"
@@ -218,3 +223,64 @@ def test_shopify_sorting_hat_header():
     shopify = result["commerce_cms"].get("Shopify")
     assert shopify is not None
     assert shopify["confidence"] >= 1
+
+
+def test_compiled_fingerprints_reused(wordpress_page):
+    """Compiled definitions are built once and accepted by the matcher."""
+    compiled = compile_fingerprints(CMS_FP)
+    assert isinstance(compiled, CompiledFingerprints)
+    assert compile_fingerprints(CMS_FP) is compiled
+    assert compile_fingerprints(compiled) is compiled
+
+    html, url, headers, cookies, resources = wordpress_page
+    assert match_fingerprints(
+        html, url, headers, cookies, resources, compiled
+    ) == match_fingerprints(html, url, headers, cookies, resources, CMS_FP)
+
+
+def test_compiled_fingerprints_resolve_weights():
+    fp = {
+        "scoring": {"html": 0.25},
+        "default_threshold": 0.5,
+        "vendors": [
+            {
+                "name": "Weighted",
+                "category": "test",
+                "matchers": [
+                    {"type": "html", "pattern": "foo"},
+                    {"type": "html", "pattern": "bar", "weight": 0.75},
+                    {"type": "unknown", "pattern": "baz"},
+                ],
+            }
+        ],
+    }
+    compiled = CompiledFingerprints(fp)
+    weights = [m.weight for m in compiled.matchers["html"]]
+    assert weights == [0.25, 0.75]
+    assert compiled.vendors[0].threshold == 0.5
+    assert sum(len(v) for v in compiled.matchers.values()) == 2
+
+
+def test_header_and_cookie_index():
+    compiled = compile_fingerprints(CMS_FP)
+    assert "x-generator" in compiled.header_index
+    assert "sc_analytics_global_cookie" in compiled.cookie_index
+    assert any("X-ShopId" in m.name for m in compiled.header_patterns)
+
+    matched = [m.vendor for m in compiled._header_matchers("x-shopid")]
+    assert [compiled.vendors[i].name for i in matched] == ["Shopify"]
+    assert compiled._header_matchers("x-unrelated") == []
+
+    result = compiled.match(
+        "",
+        "https://example.com/",
+        {"X-Generator": "Drupal 10", "X-Drupal-Cache": "HIT"},
+        {"SC_ANALYTICS_GLOBAL_COOKIE": ""},
+        [],
+    )
+    drupal = result["oss_cms"]["Drupal (incl. Acquia Drupal)"]
+    assert drupal["evidence"]["response_header"] == [
+        "X-Generator:Drupal",
+        "X-Drupal-Cache|X-Drupal-Dynamic-Cache:.+",
+    ]
+    assert "enterprise_cms" not in result
@@ -0,0 +1,64 @@
+import asyncio
+
+from services.martech.cpu_pool import CpuPool, LoopLagMonitor
+from services.shared.document import parse_document
+from services.shared.fingerprint import (
+    DEFAULT_CMS_FINGERPRINTS,
+    DEFAULT_FINGERPRINTS,
+    FingerprintSet,
+    PageModel,
+    detect_all,
+)
+
+SETS = [
+    FingerprintSet("vendors", DEFAULT_FINGERPRINTS),
+    FingerprintSet("cms", DEFAULT_CMS_FINGERPRINTS, include_scripts=False),
+]
+HTML = (
+    "<meta name='generator' content='WordPress'>"
+    "<script src='https://cdn.segment.com/analytics.js'></script>"
+    "<script>analytics.load('XYZ');</script>"
+)
+ARGS = (HTML, "https://example.com/", {}, {}, ["https://cdn.segment.com/analytics.js"], [])
+
+
+def test_offloaded_work_matches_inline():
+    pool = CpuPool(workers=1, min_bytes=10)
+
+    async def main():
+        doc = await pool.parse(HTML, SETS)
+        detected = await pool.detect(ARGS, SETS)
+        return doc, detected
+
+    try:
+        doc, detected = asyncio.run(main())
+    finally:
+        pool.shutdown()
+    assert doc == parse_document(HTML)
+    assert detected == detect_all(PageModel(*ARGS), SETS)
+    assert pool.stats()["offloaded"] == 2
+    assert pool.stats()["inline"] == 0
+
+
+def test_small_pages_stay_inline():
+    pool = CpuPool(workers=1, min_bytes=10_000_000)
+    detected = asyncio.run(pool.detect(ARGS, SETS))
+    assert "Segment" in detected["vendors"]["core"]
+    assert pool.stats()["inline"] == 1
+    assert pool.stats()["running"] is False
+
+
+def test_loop_lag_monitor_records_blocking():
+    monitor = LoopLagMonitor(interval=0.01)
+
+    async def main():
+        monitor.start()
+        await asyncio.sleep(0.02)
+        sum(range(3_000_000))  # block the loop
+        await asyncio.sleep(0.03)
+        monitor.stop()
+
+    asyncio.run(main())
+    stats = monitor.stats()
+    assert stats["samples"] >= 2
+    assert stats["max_ms"] > 5
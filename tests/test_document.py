@@ -0,0 +1,57 @@
+from services.shared.document import parse_document
+
+HTML = """
+<html><head>
+<link rel="preconnect" href="https://fonts.gstatic.com">
+<link rel="dns-prefetch stylesheet" href="//cdn.segment.com">
+<link rel="stylesheet" href="/site.css">
+<script src="https://www.googletagmanager.com/gtm.js"></script>
+<script>window.dataLayer = [];</script>
+<script></script>
+</head><body>
+<img src="/a.png"><img alt="no src">
+<picture><source srcset="/b.webp 1x, /b@2x.webp 2x"><source src="/c.mp4"></picture>
+<script src="/app.js"></script>
+</body></html>
+"""
+
+
+def test_parse_document_collects_elements():
+    doc = parse_document(HTML)
+    assert doc.script_srcs == ["https://www.googletagmanager.com/gtm.js", "/app.js"]
+    assert doc.inline_scripts == ["window.dataLayer = [];"]
+    assert doc.resource_hints == ["https://fonts.gstatic.com", "//cdn.segment.com"]
+    assert doc.images == ["/a.png"]
+    assert doc.srcsets == ["/b.webp", "/b@2x.webp", "/c.mp4"]
+    assert doc.hint_urls() == {
+        "https://fonts.gstatic.com",
+        "//cdn.segment.com",
+        "/a.png",
+        "/b.webp",
+        "/b@2x.webp",
+        "/c.mp4",
+    }
+
+
+def test_parse_document_empty():
+    doc = parse_document("")
+    assert doc.script_srcs == [] and doc.hint_urls() == set()
+
+
+PARITY_CASES = [
+    HTML,
+    "<SCRIPT SRC='/Upper.js'></SCRIPT><IMG SRC=/i.png>",
+    "<script>var s = '</div><img src=x>';</script>",
+    "<script src>inline with empty src</script>",
+    "<script src='/a.js' src='/b.js'></script>",
+    "<img src='/x.png?a=1&amp;b=2'><link rel=PRECONNECT href=//x>",
+    "<!-- <script src='/commented.js'></script> --><script>a()</script>",
+    "<p><script>unterminated(",
+    "<source srcset=''><source src='/v.mp4'><img src=''>",
+    "<script>\n</script><script type='module'>import x from '/m.js'</script>",
+]
+
+
+def test_fast_parser_matches_bs4():
+    for html in PARITY_CASES:
+        assert parse_document(html, "fast") == parse_document(html, "bs4"), html
@@ -0,0 +1,56 @@
+from services.shared.domains import DomainTrie, domain_suffixes
+from services.shared.fingerprint import CompiledFingerprints
+
+
+def test_domain_suffixes():
+    assert domain_suffixes(r"cdn\.segment\.com") == {"cdn.segment.com"}
+    assert domain_suffixes(r"A\.com|b\.net") == {"a.com", "b.net"}
+    assert domain_suffixes(r"api-[a-z0-9-]+\.hygraph\.com") is None
+    assert domain_suffixes(r"connect\.facebook\.net.*fbevents\.js") is None
+    assert domain_suffixes("hotjar") is None
+
+
+def test_trie_matches_domain_and_subdomains():
+    trie: DomainTrie[str] = DomainTrie()
+    trie.add("segment.com", "segment")
+    trie.add("cdn.segment.com", "cdn")
+    assert list(trie.lookup("segment.com")) == ["segment"]
+    assert list(trie.lookup("CDN.segment.com")) == ["segment", "cdn"]
+    assert list(trie.lookup("evil-segment.com")) == []
+    assert list(trie.lookup("segment.com.evil.net")) == []
+
+
+def test_host_matchers_use_trie_and_regex_fallback():
+    fp = {
+        "vendors": [
+            {
+                "name": "Trie",
+                "category": "test",
+                "matchers": [{"type": "asset_host", "pattern": r"hotjar\.com"}],
+            },
+            {
+                "name": "Regex",
+                "category": "test",
+                "matchers": [
+                    {"type": "api_host", "pattern": r"api-[a-z0-9]+\.hygraph\.com"}
+                ],
+            },
+        ]
+    }
+    compiled = CompiledFingerprints(fp)
+    assert compiled.host_trie.size == 1
+    assert [m.pattern for m in compiled.host_regexes] == [
+        r"api-[a-z0-9]+\.hygraph\.com"
+    ]
+
+    urls = [
+        "https://static.hotjar.com/c/hotjar.js",
+        "https://static.hotjar.com/c/hotjar.js",
+        "https://api-eu1.hygraph.com/v2/graphql",
+        "/relative/path.js",
+    ]
+    result = compiled.match("", "", {}, {}, urls)["test"]
+    assert result["Trie"]["evidence"] == {"asset_host": [r"hotjar\.com"]}
+    assert result["Regex"]["evidence"] == {
+        "api_host": [r"api-[a-z0-9]+\.hygraph\.com"]
+    }
@@ -473,3 +473,120 @@ def test_generate_accepts_legacy_list(monkeypatch):
     )
     assert r.status_code == 200
     assert r.json()["result"] == {"ok": True}
+
+
+def test_analyze_batch_streams_merged_lines(monkeypatch):
+    property_calls: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/analyze/batch":
+            urls = json.loads(request.content)["urls"]
+            lines = [
+                json.dumps({"index": i, "url": u, "result": {"core": ["GA"], "cms": ["WordPress"]}})
+                for i, u in reversed(list(enumerate(urls)))
+            ]
+            return httpx.Response(200, text="\n".join(lines) + "\n")
+        if "property" in str(request.url):
+            property_calls.append(json.loads(request.content)["domain"])
+            return httpx.Response(200, json={"domains": ["example.com"]})
+        return httpx.Response(404)
+
+    _set_mock_transport(monkeypatch, httpx.MockTransport(handler))
+
+    r = client.post(
+        "/analyze/batch",
+        json={"urls": ["https://Example.com/", "example.com/about", "http://"]},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[2]["error"] == "Invalid URL"
+    assert by_index[0]["url"] == "https://example.com"
+    assert by_index[0]["martech"] == {"core": ["GA"]}
+    assert by_index[0]["cms"] == ["WordPress"]
+    assert by_index[1]["property"] == {"domains": ["example.com"]}
+    assert by_index[1]["degraded"] is False
+    assert property_calls == ["example.com"]
+
+
+def test_analyze_batch_martech_failure(monkeypatch):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/analyze/batch":
+            return httpx.Response(500, text="boom")
+        return httpx.Response(200, json={"domains": []})
+
+    _set_mock_transport(monkeypatch, httpx.MockTransport(handler))
+
+    r = client.post("/analyze/batch", json={"urls": ["https://a.com", "https://b.com"]})
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert len(lines) == 2
+    assert all(line["degraded"] and line["error"] for line in lines)
+    assert all(line["property"] == {"domains": []} for line in lines)
+
+
+def test_analyze_stream_emits_sections_progressively(monkeypatch):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/analyze/stream":
+            lines = [
+                {"tier": "fast", "result": {"core": ["GA"], "cms": ["WordPress"]}},
+                {"tier": "deep", "result": {"core": ["GA", "Segment"], "cms": ["WordPress"]}},
+            ]
+            return httpx.Response(200, text="".join(json.dumps(x) + "\n" for x in lines))
+        if "property" in str(request.url):
+            return httpx.Response(200, json={"domains": ["example.com"]})
+        return httpx.Response(404)
+
+    _set_mock_transport(monkeypatch, httpx.MockTransport(handler))
+
+    r = client.post("/analyze/stream", json={"url": "https://example.com"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert {"section": "property", "property": {"domains": ["example.com"]}} in lines
+    martech = [line for line in lines if line["section"] in ("martech", "cms")]
+    assert martech == [
+        {"section": "martech", "tier": "fast", "martech": {"core": ["GA"]}},
+        {"section": "cms", "tier": "fast", "cms": ["WordPress"]},
+        {"section": "martech", "tier": "deep", "martech": {"core": ["GA", "Segment"]}},
+        {"section": "cms", "tier": "deep", "cms": ["WordPress"]},
+    ]
+    assert lines[-1] == {"section": "done", "degraded": False}
+
+
+def test_analyze_stream_martech_failure(monkeypatch):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/analyze/stream":
+            return httpx.Response(500, text="boom")
+        return httpx.Response(200, json={"domains": []})
+
+    _set_mock_transport(monkeypatch, httpx.MockTransport(handler))
+
+    r = client.post("/analyze/stream", json={"url": "https://a.com"})
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert {"section": "property", "property": {"domains": []}} in lines
+    assert {"section": "martech", "error": "martech service unavailable"} in lines
+    assert lines[-1] == {"section": "done", "degraded": True}
+    assert client.post("/analyze/stream", json={"url": "http://"}).status_code == 400
+
+
+def test_analyze_batch_splits_martech_calls(monkeypatch):
+    chunks: list[list[str]] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/analyze/batch":
+            urls = json.loads(request.content)["urls"]
+            chunks.append(urls)
+            lines = [json.dumps({"index": i, "result": {"core": [u]}}) for i, u in enumerate(urls)]
+            return httpx.Response(200, text="\n".join(lines) + "\n")
+        return httpx.Response(200, json={"domains": []})
+
+    _set_mock_transport(monkeypatch, httpx.MockTransport(handler))
+    monkeypatch.setattr(gateway_app, "MARTECH_BATCH_SIZE", 2)
+
+    urls = [f"https://site{i}.com" for i in range(5)]
+    r = client.post("/analyze/batch", json={"urls": urls})
+    lines = sorted((json.loads(line) for line in r.text.splitlines()), key=lambda x: x["index"])
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [line["martech"]["core"] for line in lines] == [[u] for u in urls]
+    assert not any(line["degraded"] for line in lines)
@@ -0,0 +1,120 @@
+import asyncio
+
+from services.martech.jobs import CANCELLED, DONE, RUNNING, JobRunner, JobStore
+
+
+def test_job_runs_and_pages_results():
+    store = JobStore()
+
+    async def analyze(url, options):
+        if "bad" in url:
+            raise RuntimeError("boom")
+        return {"core": [url], "headless": options["headless"]}
+
+    async def main():
+        runner = JobRunner(store, analyze, concurrency=2)
+        job_id = store.create(["https://a", "https://bad", "https://c"], {"headless": True})
+        runner.submit(job_id)
+        while store.get(job_id)["status"] != DONE:
+            await asyncio.sleep(0.01)
+        return job_id
+
+    job_id = asyncio.run(main())
+    job = store.get(job_id)
+    assert (job["total"], job["done"], job["failed"]) == (3, 3, 1)
+    page = store.results(job_id, offset=0, limit=2)
+    assert page[0] == {"index": 0, "url": "https://a", "result": {"core": ["https://a"], "headless": True}}
+    assert page[1] == {"index": 1, "url": "https://bad", "error": "internal error"}
+    assert [item["index"] for item in store.results(job_id, offset=2)] == [2]
+
+
+def test_job_resumes_after_restart_and_cancel(tmp_path):
+    # The data directory is created on first use.
+    path = tmp_path / "data" / "jobs.db"
+    store = JobStore(path)
+    job_id = store.create(["https://a", "https://b", "https://c"], {})
+    store.set_status(job_id, RUNNING)
+    store.complete(job_id, 0, result={"core": []})
+    store.close()
+
+    seen: list[str] = []
+
+    async def analyze(url, options):
+        seen.append(url)
+        return {}
+
+    async def main():
+        restarted = JobStore(path)
+        runner = JobRunner(restarted, analyze, concurrency=1)
+        runner.resume()
+        while restarted.get(job_id)["status"] != DONE:
+            await asyncio.sleep(0.01)
+
+        blocked = asyncio.Event()
+
+        async def slow(url, options):
+            await blocked.wait()
+            return {}
+
+        other = restarted.create(["https://slow"], {})
+        runner.analyze = slow
+        runner.submit(other)
+        await asyncio.sleep(0.01)
+        assert runner.cancel(other)
+        await runner.stop()
+        return restarted.get(other)
+
+    cancelled = asyncio.run(main())
+    assert seen == ["https://b", "https://c"]
+    assert cancelled["status"] == CANCELLED
+    assert cancelled["done"] == 0
+
+
+def test_workers_sharing_a_store_claim_each_job_once(tmp_path):
+    path = tmp_path / "jobs.db"
+    seen: list[str] = []
+
+    async def analyze(url, options):
+        seen.append(url)
+        await asyncio.sleep(0.01)
+        return {}
+
+    async def main():
+        first, second = JobStore(path), JobStore(path)
+        job_id = first.create(["https://a", "https://b"], {})
+        runners = [JobRunner(first, analyze, 2), JobRunner(second, analyze, 2)]
+        for runner in runners:
+            runner.resume()
+        while first.get(job_id)["status"] != DONE:
+            await asyncio.sleep(0.01)
+        for runner in runners:
+            await runner.stop()
+
+    asyncio.run(main())
+    assert sorted(seen) == ["https://a", "https://b"]
+
+
+def test_cancel_through_another_worker_is_not_overwritten(tmp_path):
+    path = tmp_path / "jobs.db"
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def slow(url, options):
+            await gate.wait()
+            return {}
+
+        owner_store, other_store = JobStore(path), JobStore(path)
+        job_id = owner_store.create(["https://a", "https://b", "https://c"], {})
+        owner = JobRunner(owner_store, slow, 1)
+        owner.submit(job_id)
+        await asyncio.sleep(0.01)
+        assert JobRunner(other_store, slow, 1).cancel(job_id)
+        gate.set()
+        task = owner._tasks[job_id]
+        await task
+        return owner_store.get(job_id)
+
+    job = asyncio.run(main())
+    assert job["status"] == CANCELLED
+    assert job["done"] == 1
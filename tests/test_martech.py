@@ -1,10 +1,15 @@
+import asyncio
+import json
 import threading
+import time
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
 from fastapi.testclient import TestClient
 
 import services.martech.app
 from services.martech.app import app, _extract_scripts
+from services.martech.backoff import HostBackoff
+from services.shared.fingerprint import load_fingerprints
 import os
 import httpx
 import pytest
@@ -54,6 +59,15 @@ def test_health():
     assert r.status_code == 200
 
 
+def test_cache_stats():
+    r = client.get("/cache/stats")
+    assert r.status_code == 200
+    scripts = r.json()["scripts"]
+    assert {"hits", "misses", "bytes_saved", "evictions"} <= set(scripts)
+    assert {"entries", "hits", "misses"} <= set(r.json()["script_matches"])
+    assert {"entries", "bytes", "hits", "misses", "evictions"} <= set(r.json()["analysis"])
+
+
 def test_ready_and_analyze():
     # spin up simple http server
     server = HTTPServer(("localhost", 0), SimpleHandler)
@@ -145,6 +159,7 @@ def test_analyze_handles_request_error(monkeypatch):
         raise httpx.RequestError("fail", request=req)
 
     monkeypatch.setattr("services.martech.app._fetch", boom_fetch)
+    monkeypatch.setattr("services.martech.app.host_backoff", HostBackoff())
 
     resp = client.post("/analyze", json={"url": "http://example.com", "debug": True})
     assert resp.status_code == 200
@@ -152,6 +167,30 @@ def test_analyze_handles_request_error(monkeypatch):
     assert data["network_error"] is True
 
 
+def test_failed_hosts_are_backed_off_and_negatively_cached(monkeypatch):
+    calls = {"count": 0}
+
+    async def timeout_fetch(_client, _url):
+        calls["count"] += 1
+        raise httpx.ReadTimeout("slow", request=httpx.Request("GET", _url))
+
+    monkeypatch.setattr("services.martech.app._fetch", timeout_fetch)
+    monkeypatch.setattr("services.martech.app.host_backoff", HostBackoff())
+    services.martech.app.cache.clear()
+
+    r1 = client.post("/analyze", json={"url": "https://dead.example"})
+    assert r1.json()["network_error"] is True
+    assert calls["count"] == 1
+    # Served from the negative cache.
+    client.post("/analyze", json={"url": "https://dead.example"})
+    # force skips the cache, but the host is still backed off.
+    r3 = client.post("/analyze", json={"url": "https://dead.example/other", "force": True})
+    assert r3.json()["network_error"] is True
+    assert calls["count"] == 1
+    assert client.get("/cache/stats").json()["backoff"]["blocked"] == 1
+    services.martech.app.cache.clear()
+
+
 def _set_mock_client(monkeypatch, handler: httpx.MockTransport, hook=None) -> None:
     class DummyClient(httpx.AsyncClient):
         def __init__(self, *args, **kwargs):
@@ -264,24 +303,16 @@ async def test_headless_playwright_uses_proxy(monkeypatch):
 
     monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
     monkeypatch.setattr("services.martech.app._extract_scripts", fake_extract)
-    monkeypatch.setattr(
-        "services.martech.app.detect_vendors",
-        lambda *a, **k: {},
-    )
-    monkeypatch.setattr(
-        "services.martech.app.match_fingerprints",
-        lambda *a, **k: {},
-    )
     monkeypatch.setattr("services.martech.app.cms_fingerprints", {})
 
     captured: dict[str, object] = {}
 
     class DummyPage:
-        async def goto(self, *args, **kwargs):
+        async def route(self, pattern, handler):
             pass
 
-        async def content(self):
-            return ""
+        async def goto(self, *args, **kwargs):
+            pass
 
     class DummyContext:
         async def new_page(self):
@@ -328,6 +359,89 @@ async def test_headless_playwright_uses_proxy(monkeypatch):
     assert captured["proxy"] == {"server": "http://proxy.local"}
 
 
+@pytest.mark.asyncio
+async def test_headless_capture_records_and_blocks_requests():
+    class FakeRequest:
+        def __init__(self, url, resource_type, frame, navigation=False):
+            self.url = url
+            self.resource_type = resource_type
+            self.frame = frame
+            self.navigation = navigation
+
+        def is_navigation_request(self):
+            return self.navigation
+
+    class FakeRoute:
+        def __init__(self, request):
+            self.request = request
+            self.action = None
+
+        async def abort(self):
+            self.action = "abort"
+
+        async def continue_(self):
+            self.action = "continue"
+
+    class FakePage:
+        main_frame = object()
+
+        async def route(self, pattern, handler):
+            self.handler = handler
+
+        async def goto(self, url, **kwargs):
+            self.routes = [
+                FakeRoute(FakeRequest(url, "document", self.main_frame, True)),
+                FakeRoute(FakeRequest("https://cdn.segment.com/a.js", "script", self.main_frame)),
+                FakeRoute(FakeRequest("https://px.ads.example/p.gif", "image", self.main_frame)),
+                FakeRoute(FakeRequest("https://tags.example/frame", "document", object(), True)),
+            ]
+            for route in self.routes:
+                await self.handler(route)
+
+    page = FakePage()
+    urls = await services.martech.app._capture_requests(page, "https://example.com/")
+
+    assert urls == {
+        "https://cdn.segment.com/a.js",
+        "https://px.ads.example/p.gif",
+        "https://tags.example/frame",
+    }
+    assert [r.action for r in page.routes] == ["continue", "continue", "abort", "continue"]
+
+
+@pytest.mark.asyncio
+async def test_headless_renders_are_cached(monkeypatch):
+    calls = []
+    results = iter([None, {"https://cdn.segment.com/analytics.js"}])
+
+    async def fake_headless(url, proxy=None):
+        calls.append(url)
+        return next(results)
+
+    async def fake_fetch(_client, _url):
+        return "<html></html>", {}, {}
+
+    async def fake_extract(_client, _html, base_url=None):
+        return set(), [], []
+
+    monkeypatch.setattr("services.martech.app._headless_request", fake_headless)
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app._extract_scripts", fake_extract)
+    services.martech.app.render_cache.clear()
+
+    analyze = services.martech.app.analyze_url
+    # A failed render is not cached.
+    await analyze("https://example.com/", headless=True)
+    first = await analyze("https://example.com/", debug=True, headless=True)
+    second = await analyze("https://example.com/", debug=True, headless=True)
+
+    assert len(calls) == 2
+    assert first["debug"]["scripts"] == ["https://cdn.segment.com/analytics.js"]
+    assert second["debug"]["scripts"] == first["debug"]["scripts"]
+    assert services.martech.app.render_cache.stats()["hits"] == 1
+    services.martech.app.render_cache.clear()
+
+
 def test_diagnose_mocked_asyncclient_success(monkeypatch):
     class DummyClient:
         def __init__(self, *args, **kwargs):
@@ -400,7 +514,7 @@ async def test_extract_scripts_parses_gtm(monkeypatch):
         's.src="https://cdn.example.com/inner.js";'
     )
 
-    async def fake_fetch(_client, _url):
+    async def fake_fetch(_client, _url, max_chars=None):
         return js_content, {}, {}
 
     monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
@@ -415,6 +529,113 @@ async def test_extract_scripts_parses_gtm(monkeypatch):
     assert external == [js_content]
 
 
+@pytest.mark.asyncio
+async def test_extract_scripts_concurrent_dedupe_and_budget(monkeypatch):
+    import asyncio
+
+    html = "".join(
+        f"<script src='{src}'></script>"
+        for src in [
+            "/a.js",
+            "http://example.com/a.js",
+            "/b.js",
+            "/c.js",
+            "/d.js",
+            "/e.js",
+        ]
+    )
+    state = {"active": 0, "peak": 0, "fetched": []}
+
+    async def fake_fetch(_client, url, max_chars=None):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        state["fetched"].append(url)
+        if url.endswith("/c.js"):
+            raise httpx.RequestError("fail")
+        return url[-4:] * 3, {}, {}
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app.SCRIPT_FETCH_CONCURRENCY", 2)
+    monkeypatch.setattr("services.martech.app.MAX_SCRIPTS_PER_PAGE", 4)
+    monkeypatch.setattr("services.martech.app.MAX_SCRIPT_BYTES_PER_PAGE", 30)
+
+    urls, inline, external = await _extract_scripts(
+        object(), html, base_url="http://example.com/"
+    )
+
+    assert "/e.js" in urls and "http://example.com/a.js" in urls
+    assert sorted(state["fetched"]) == [
+        "http://example.com/a.js",
+        "http://example.com/b.js",
+        "http://example.com/c.js",
+        "http://example.com/d.js",
+    ]
+    assert state["peak"] == 2
+    # a.js and b.js fit the 30 character budget, c.js failed, d.js overflows.
+    assert external == ["a.jsa.jsa.js", "b.jsb.jsb.js", ""]
+
+
+@pytest.mark.asyncio
+async def test_extract_scripts_skips_only_oversized_bodies(monkeypatch):
+    html = "".join(f"<script src='/{name}.js'></script>" for name in "abc")
+    sizes = {"a": 5, "b": 50, "c": 5}
+
+    async def fake_fetch(_client, url, max_chars=None):
+        name = url[-4]
+        # Finish in reverse page order to show the budget follows the page.
+        await asyncio.sleep(0.01 * (3 - "abc".index(name)))
+        return name * sizes[name], {}, {}
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app.MAX_SCRIPT_BYTES_PER_PAGE", 20)
+
+    _, _, external = await _extract_scripts(
+        object(), html, base_url="http://budget.example/"
+    )
+
+    assert external == ["aaaaa", "ccccc"]
+
+
+@pytest.mark.asyncio
+async def test_extract_scripts_never_requests_over_budget_scripts(monkeypatch):
+    host = "http://stream.example"
+    html = "".join(
+        f"<script src='{src}'></script>"
+        for src in ["/a.js", "/big.js", "/c.js", "/d.js", "https://www.googletagmanager.com/gtm.js"]
+    )
+    requested: list[str] = []
+    sent = {"big": 0}
+
+    async def big_body():
+        for _ in range(100):
+            sent["big"] += 1
+            yield b"x" * 10
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        if request.url.path == "/big.js":
+            return httpx.Response(200, content=big_body())
+        if request.url.host == "www.googletagmanager.com":
+            return httpx.Response(200, text='s="https://x.io/i.js"')
+        return httpx.Response(200, text={"/a.js": "a" * 30, "/c.js": "c" * 10}.get(request.url.path, "d"))
+
+    monkeypatch.setattr("services.martech.app.SCRIPT_FETCH_CONCURRENCY", 1)
+    monkeypatch.setattr("services.martech.app.MAX_SCRIPT_BYTES_PER_PAGE", 40)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        urls, _, external = await _extract_scripts(http, html, base_url=host)
+
+    # a.js and c.js use the whole budget, so d.js is never requested; the
+    # oversized body is abandoned after its first chunk.
+    assert requested == ["/a.js", "/big.js", "/c.js", "/gtm.js"]
+    assert sent["big"] <= 2
+    assert external == ["a" * 30, "c" * 10]
+    # The GTM container is read for its URLs even though it did not fit.
+    assert "https://x.io/i.js" in urls
+
+
 def test_force_bypasses_cache(monkeypatch):
     calls = {"count": 0}
 
@@ -592,3 +813,334 @@ def test_generate_proxies_to_insight(monkeypatch):
     assert r.json() == {"ok": True}
     assert captured["path"] == "/insight-and-personas"
     assert captured["data"]["cms"] == ["WP"]
+
+
+def test_cache_key_variants(monkeypatch):
+    calls: list[tuple[str, bool]] = []
+
+    async def fake_analyze_url(url: str, debug: bool = False, headless: bool = False):
+        calls.append((url, headless))
+        return {"core": {}}
+
+    monkeypatch.setattr("services.martech.app.analyze_url", fake_analyze_url)
+    services.martech.app.cache.clear()
+
+    client.post("/analyze", json={"url": "https://Variant.com/"})
+    client.post("/analyze", json={"url": "https://variant.com"})
+    assert len(calls) == 1
+
+    client.post("/analyze", json={"url": "https://variant.com", "headless": True})
+    assert calls[-1] == ("https://variant.com", True)
+    client.post("/analyze", json={"url": "https://variant.com?page=2"})
+    assert len(calls) == 3
+
+    monkeypatch.setattr(
+        "services.martech.app.fingerprints", {"vendors": {}, "_rev": 2}
+    )
+    client.post("/analyze", json={"url": "https://variant.com"})
+    assert len(calls) == 4
+
+
+def test_concurrent_analyses_are_coalesced(monkeypatch):
+    calls = {"count": 0}
+
+    async def fake_analyze_url(url: str, debug: bool = False, headless: bool = False):
+        calls["count"] += 1
+        await asyncio.sleep(0.05)
+        return {"core": {"GA": {}}}
+
+    monkeypatch.setattr("services.martech.app.analyze_url", fake_analyze_url)
+    services.martech.app.cache.clear()
+    before = services.martech.app.inflight.coalesced
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await asyncio.gather(
+                *(c.post("/analyze", json={"url": "https://burst.com"}) for _ in range(5))
+            )
+
+    responses = asyncio.run(burst())
+    assert [r.json()["core"] for r in responses] == [["GA"]] * 5
+    assert calls["count"] == 1
+    assert services.martech.app.inflight.coalesced == before + 4
+    assert len(services.martech.app.inflight) == 0
+
+
+def test_stale_entries_served_while_refreshing(monkeypatch):
+    calls = {"count": 0}
+
+    async def fake_analyze_url(url: str, debug: bool = False, headless: bool = False):
+        calls["count"] += 1
+        return {"core": {f"V{calls['count']}": {}}}
+
+    monkeypatch.setattr("services.martech.app.analyze_url", fake_analyze_url)
+    monkeypatch.setattr(services.martech.app.cache, "ttl", 0)
+    monkeypatch.setattr(services.martech.app.cache, "stale_ttl", 60)
+    services.martech.app.cache.clear()
+
+    with TestClient(app) as c:
+        r1 = c.post("/analyze", json={"url": "https://stale.com"})
+        assert r1.json()["core"] == ["V1"]
+        assert "stale" not in r1.json()
+        r2 = c.post("/analyze", json={"url": "https://stale.com"})
+        assert r2.json()["core"] == ["V1"]
+        assert r2.json()["stale"] is True
+        for _ in range(50):
+            if calls["count"] == 2 and not services.martech.app._refreshes:
+                break
+            time.sleep(0.01)
+        assert calls["count"] == 2
+        stats = c.get("/cache/stats").json()
+        assert stats["refresh"]["started"] >= 1
+        assert stats["analysis"]["stale_hits"] >= 1
+    services.martech.app.cache.clear()
+
+
+def test_analyze_batch_streams_ndjson(monkeypatch):
+    async def fake_fetch(_client, url):
+        if "bad" in url:
+            raise RuntimeError("boom")
+        return "<script>gtag('js', new Date());</script>", {}, {}
+
+    async def fake_extract(_client, _html, base_url=None):
+        return set(), [], []
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app._extract_scripts", fake_extract)
+    monkeypatch.setattr(
+        "services.martech.app.fingerprints",
+        load_fingerprints(services.martech.app.FINGERPRINT_PATH),
+    )
+    services.martech.app.cache.clear()
+    services.martech.app.cache.set(
+        services.martech.app._cache_key("https://cached.com", False),
+        {"core": {"Segment": {}}, "cms": {}, "network_error": False},
+    )
+
+    r = client.post(
+        "/analyze/batch",
+        json={"urls": ["https://one.com", "https://bad.com", "https://cached.com"]},
+    )
+    assert r.status_code == 200
+    lines = sorted(
+        (json.loads(line) for line in r.text.splitlines()), key=lambda x: x["index"]
+    )
+    assert "Google Analytics" in lines[0]["result"]["core"]
+    assert lines[1] == {"index": 1, "url": "https://bad.com", "error": "internal error"}
+    assert lines[2]["result"]["core"] == ["Segment"]
+    assert services.martech.app.cache.get(
+        services.martech.app._cache_key("https://one.com", False)
+    )
+
+    stats = client.get("/pipeline/stats").json()
+    assert stats["fetch"]["processed"] >= 1
+    assert stats["fetch"]["failed"] >= 1
+    assert stats["match"]["processed"] >= 1
+    assert stats["match"]["queue_depth"] == 0
+
+    monkeypatch.setattr("services.martech.app.MAX_BATCH_URLS", 1)
+    r = client.post("/analyze/batch", json={"urls": ["https://a.com", "https://b.com"]})
+    assert r.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_dedupes_and_joins_flights(monkeypatch):
+    fetched = []
+
+    async def fake_fetch(_client, url):
+        fetched.append(url)
+        return "<html></html>", {}, {}
+
+    async def fake_extract(_client, _html, base_url=None):
+        return set(), [], []
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app._extract_scripts", fake_extract)
+    services.martech.app.cache.clear()
+    # Another request is already analysing joined.com.
+    flight = services.martech.app.inflight.claim(
+        services.martech.app._cache_key("https://joined.com", False)
+    )
+
+    async def finish_flight():
+        await asyncio.sleep(0.05)
+        flight.set_result({"core": {"Segment": {}}, "cms": {}, "network_error": False})
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://martech") as c:
+        finisher = asyncio.create_task(finish_flight())
+        r = await c.post(
+            "/analyze/batch",
+            json={"urls": ["https://dup.com", "https://dup.com", "https://joined.com"]},
+        )
+        await finisher
+
+    lines = sorted(
+        (json.loads(line) for line in r.text.splitlines()), key=lambda x: x["index"]
+    )
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert lines[0]["result"] == lines[1]["result"]
+    assert lines[2]["result"]["core"] == ["Segment"]
+    assert fetched == ["https://dup.com"]
+    services.martech.app.cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_claims_flights_as_pages_enter(monkeypatch):
+    app_module = services.martech.app
+    release = asyncio.Event()
+
+    async def fake_fetch(_client, url):
+        if url == "https://a.com":
+            await release.wait()
+        return "<html></html>", {}, {}
+
+    async def fake_extract(_client, _html, base_url=None):
+        return set(), [], []
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app._extract_scripts", fake_extract)
+    monkeypatch.setattr("services.martech.app.PIPELINE_FETCH_CONCURRENCY", 1)
+    monkeypatch.setattr("services.martech.app.PIPELINE_QUEUE_SIZE", 1)
+    await app_module._startup()
+    app_module.cache.clear()
+
+    urls = [f"https://{name}.com" for name in "abcd"]
+    response = await app_module.analyze_batch(app_module.BatchAnalyzeRequest(urls=urls))
+    lines = response.body_iterator.__aiter__()
+    reader = asyncio.create_task(lines.__anext__())
+    await asyncio.sleep(0.05)
+    # a.com is being fetched and b.com and c.com are queued; d.com is not
+    # claimed yet, so other callers may start it themselves.
+    assert app_module._cache_key("https://a.com", False) in app_module.inflight
+    assert app_module._cache_key("https://d.com", False) not in app_module.inflight
+    release.set()
+    received = [await reader] + [line async for line in lines]
+    assert len(received) == 4
+    app_module.cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_batch_hands_its_flights_off(monkeypatch):
+    app_module = services.martech.app
+    release = asyncio.Event()
+
+    async def fake_fetch(_client, url):
+        if url == "https://slow.com":
+            await release.wait()
+        return "<script>gtag('js', new Date());</script>", {}, {}
+
+    async def fake_extract(_client, _html, base_url=None):
+        return set(), [], []
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app._extract_scripts", fake_extract)
+    await app_module._startup()
+    monkeypatch.setattr(
+        "services.martech.app.fingerprints", load_fingerprints(app_module.FINGERPRINT_PATH)
+    )
+    app_module.cache.clear()
+
+    request = app_module.BatchAnalyzeRequest(urls=["https://fast.com", "https://slow.com"])
+    response = await app_module.analyze_batch(request)
+    lines = response.body_iterator.__aiter__()
+    assert json.loads(await lines.__anext__())["url"] == "https://fast.com"
+    key = app_module._cache_key("https://slow.com", False)
+    joiner = asyncio.create_task(
+        app_module._analyze_cached(key, "https://slow.com", False, False)
+    )
+    await asyncio.sleep(0)
+    # The reader goes away while slow.com is still being analysed.
+    await lines.aclose()
+    release.set()
+    result = await asyncio.wait_for(joiner, 5)
+    assert "Google Analytics" in result["core"]
+    assert app_module.cache.get(key)
+    app_module.cache.clear()
+
+
+def test_tiered_analysis_returns_fast_tier_first(monkeypatch):
+    segment = "https://cdn.segment.com/analytics.js"
+
+    async def fake_fetch(_client, _url):
+        return "<html></html>", {}, {}
+
+    async def fake_extract(_client, _html, base_url=None):
+        await asyncio.sleep(0.2)
+        return {segment}, [], []
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr("services.martech.app._extract_scripts", fake_extract)
+    services.martech.app.cache.clear()
+
+    body = {"url": "https://tiered.com", "debug": True, "tiered": True}
+    with TestClient(app) as c:
+        fast = c.post("/analyze", json=body).json()
+        assert fast["tier"] == "fast"
+        assert fast["debug"]["scripts"] == []
+        deadline = time.time() + 5
+        while c.get("/cache/stats").json()["deep"]["running"] and time.time() < deadline:
+            time.sleep(0.01)
+        deep = c.post("/analyze", json=body).json()
+        assert deep["tier"] == "deep"
+        assert deep["debug"]["scripts"] == [segment]
+
+        r = c.post("/analyze/stream", json={**body, "url": "https://streamed.com"})
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert [line["tier"] for line in lines] == ["fast", "deep"]
+        assert lines[0]["result"]["debug"]["scripts"] == []
+        assert lines[1]["result"]["debug"]["scripts"] == [segment]
+    services.martech.app.cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_fast_tier_matches_script_hosts_from_html(monkeypatch):
+    async def fake_fetch(_client, _url):
+        html = "<script src='https://cdn.segment.com/analytics.js'></script>"
+        return html, {}, {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text="")
+
+    monkeypatch.setattr("services.martech.app._fetch", fake_fetch)
+    monkeypatch.setattr(
+        "services.martech.app.fingerprints",
+        load_fingerprints(services.martech.app.FINGERPRINT_PATH),
+    )
+    _set_mock_client(monkeypatch, httpx.MockTransport(handler))
+
+    fast: list[dict] = []
+    deep = await services.martech.app.analyze_url(
+        "https://fast-tier.com", on_fast=fast.append
+    )
+
+    assert "Segment" in fast[0]["core"]
+    assert set(fast[0]["core"]) == set(deep["core"])
+
+
+def test_jobs_api(monkeypatch):
+    async def fake_analyze_url(url: str, debug: bool = False, headless: bool = False):
+        return {"core": {"GA": {}}, "cms": {}, "network_error": False}
+
+    monkeypatch.setattr("services.martech.app.analyze_url", fake_analyze_url)
+    services.martech.app.cache.clear()
+
+    with TestClient(app) as c:
+        r = c.post("/jobs", json={"urls": ["https://j1.com", "https://j2.com"]})
+        assert r.status_code == 202
+        job_id = r.json()["id"]
+        for _ in range(100):
+            status = c.get(f"/jobs/{job_id}").json()
+            if status["status"] == "done":
+                break
+            time.sleep(0.01)
+        assert status["done"] == 2
+        page = c.get(f"/jobs/{job_id}/results", params={"limit": 1}).json()
+        assert page["items"][0]["result"]["core"] == ["GA"]
+        assert page["next_offset"] == 1
+        rest = c.get(f"/jobs/{job_id}/results", params={"offset": 1}).json()
+        assert [i["url"] for i in rest["items"]] == ["https://j2.com"]
+        assert rest["next_offset"] is None
+        assert c.delete(f"/jobs/{job_id}").json()["status"] == "done"
+        assert c.get("/jobs/missing").status_code == 404
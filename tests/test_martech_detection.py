@@ -197,3 +197,66 @@ def test_detect_hotjar_via_window(hotjar_window):
     vendors = detect_vendors(html, cookies, [], FINGERPRINTS)
     hj = vendors["adjacent"]["Hotjar"]
     assert hj["confidence"] > 0
+
+
+def test_detect_all_matches_separate_passes():
+    from services.shared.fingerprint import (
+        DEFAULT_CMS_FINGERPRINTS,
+        FingerprintSet,
+        PageModel,
+        detect_all,
+        match_fingerprints,
+    )
+
+    html = (
+        "<meta name='generator' content='WordPress'>"
+        "<script src='https://cdn.segment.com/analytics.js'></script>"
+    )
+    url = "https://example.com/wp-content/"
+    headers = {"X-Generator": "WordPress"}
+    cookies = {"_ga": "1"}
+    urls = ["https://cdn.segment.com/analytics.js"]
+    bodies = ["analytics.load('XYZ');"]
+
+    page = PageModel(html, url, headers, cookies, urls, bodies)
+    detected = detect_all(
+        page,
+        [
+            FingerprintSet("vendors", FINGERPRINTS),
+            FingerprintSet("cms", DEFAULT_CMS_FINGERPRINTS, include_scripts=False),
+        ],
+    )
+    assert detected["vendors"] == detect_vendors(
+        html, cookies, urls, FINGERPRINTS, script_bodies=bodies
+    )
+    assert detected["cms"] == match_fingerprints(
+        html, url, headers, cookies, urls, DEFAULT_CMS_FINGERPRINTS
+    )
+    assert "Segment" in detected["vendors"]["core"]
+    assert "WordPress" in detected["cms"]["oss_cms"]
+
+
+def test_script_matches_memoized_by_content_and_version():
+    from services.shared.fingerprint import (
+        PageModel,
+        compile_fingerprints,
+        script_match_stats,
+    )
+
+    engine = compile_fingerprints(FINGERPRINTS)
+    body = "analytics.load('MEMO-1');"
+    urls = ["https://cdn.segment.com/analytics.js"]
+    first = engine.match_page(PageModel("", "", {}, {}, urls, [body]))
+    before = script_match_stats()
+    second = engine.match_page(PageModel("", "", {}, {}, urls, [body]))
+    after = script_match_stats()
+    assert first == second
+    assert r"analytics\.load" in second["core"]["Segment"]["evidence"]["html"]
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+    changed = dict(FINGERPRINTS, _test_revision=1)
+    other = compile_fingerprints(changed)
+    assert other.version != engine.version
+    other.match_page(PageModel("", "", {}, {}, [], [body]))
+    assert script_match_stats()["misses"] == after["misses"] + 1
@@ -0,0 +1,58 @@
+import asyncio
+
+from services.martech.pipeline import Pipeline, Stage
+
+
+def test_pipeline_bounds_queues_and_reports_metrics():
+    active = {"fetch": 0, "peak": 0}
+
+    async def fetch(x):
+        active["fetch"] += 1
+        active["peak"] = max(active["peak"], active["fetch"])
+        await asyncio.sleep(0.001)
+        active["fetch"] -= 1
+        return x * 2
+
+    async def check(x):
+        if x == 6:
+            raise ValueError("bad")
+        return x + 1
+
+    stages = [Stage("fetch", fetch, concurrency=3), Stage("check", check, concurrency=1)]
+
+    async def main():
+        return [item async for item in Pipeline(stages, queue_size=2).run(range(10))]
+
+    results = asyncio.run(main())
+    by_index = {index: result for index, _, result in results}
+    assert sorted(by_index) == list(range(10))
+    assert by_index[0] == 1
+    assert isinstance(by_index[3], ValueError)
+    assert active["peak"] == 3
+    fetch_stats = stages[0].metrics.snapshot()
+    assert fetch_stats["processed"] == 10
+    assert fetch_stats["queue_depth"] == 0
+    assert stages[1].metrics.failed == 1
+
+
+def test_pipeline_close_cancels_workers():
+    started = []
+
+    async def slow(x):
+        started.append(x)
+        await asyncio.sleep(10)
+        return x
+
+    stage = Stage("slow", slow, concurrency=2)
+
+    async def main():
+        gen = Pipeline([stage], queue_size=1).run(range(100))
+        task = asyncio.ensure_future(gen.__anext__())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await gen.aclose()
+
+    asyncio.run(main())
+    assert len(started) == 2
+    assert stage.metrics.busy == 0
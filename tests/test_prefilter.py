@@ -0,0 +1,56 @@
+import pytest
+
+from services.shared.fingerprint import CompiledFingerprints
+from services.shared.prefilter import LiteralScanner, required_literals
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        (r"gtag\(", {"gtag("}),
+        (r"window\._satellite", {"window._satellite"}),
+        (r"amplitude\.getInstance", {"amplitude.getinstance"}),
+        (r"/libs/granite/|granite\.ui", {"/libs/granite/", "granite.ui"}),
+        (r"(foo|barbaz)+\d", {"foo", "barbaz"}),
+        (r"<meta[^>]*name=generator[^>]*WordPress", {"name=generator"}),
+    ],
+)
+def test_required_literals(pattern, expected):
+    assert required_literals(pattern) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [r"G-[A-Z0-9]+", r"foo|.+", r"(abc)?x", r"[", ".*"],
+)
+def test_required_literals_fallback(pattern):
+    assert required_literals(pattern) is None
+
+
+def test_scanner_is_case_insensitive():
+    scanner = LiteralScanner(["window.dataLayer", "gtag(", "missing"])
+    found = scanner.scan("<script>WINDOW.DATALAYER=[];gtag('js')</script>")
+    assert found == {"window.datalayer", "gtag("}
+
+
+def test_prefilter_keeps_fallback_patterns():
+    fp = {
+        "vendors": [
+            {
+                "name": "Literal",
+                "category": "test",
+                "matchers": [{"type": "html", "pattern": r"foo\.bar"}],
+            },
+            {
+                "name": "NoLiteral",
+                "category": "test",
+                "matchers": [{"type": "response_body", "pattern": r"G-[0-9]+"}],
+            },
+        ]
+    }
+    compiled = CompiledFingerprints(fp)
+    assert compiled.body_scanner.literals == ("foo.bar",)
+
+    result = compiled.match("FOO.BAR G-123", "", {}, {}, [])
+    assert set(result["test"]) == {"Literal", "NoLiteral"}
+    assert compiled.match("foo-bar", "", {}, {}, []) == {}
@@ -0,0 +1,117 @@
+import time
+
+import httpx
+import pytest
+
+from services.martech.script_cache import ScriptCache, ScriptTooLarge, freshness
+
+
+def test_freshness_rules():
+    now = 1_000_000.0
+    assert freshness({"cache-control": "public, max-age=600"}, now) == 600
+    assert freshness({"cache-control": "max-age=600", "age": "100"}, now) == 500
+    assert freshness({"cache-control": "max-age=60, s-maxage=120"}, now) == 120
+    assert freshness({"cache-control": "no-store"}, now) is None
+    assert freshness({"cache-control": "private, max-age=60"}, now) is None
+    assert freshness({"cache-control": "no-cache, max-age=60"}, now) == 0
+    assert freshness({}, now) == 0
+    assert (
+        freshness(
+            {
+                "date": "Thu, 01 Jan 2026 00:10:00 GMT",
+                "expires": "Thu, 01 Jan 2026 00:20:00 GMT",
+            },
+            now,
+        )
+        == 600
+    )
+
+
+def test_lru_eviction_by_bytes():
+    cache = ScriptCache(max_bytes=10)
+    fresh = {"cache-control": "max-age=60"}
+    cache.store("a", "aaaa", fresh)
+    cache.store("b", "bbbb", fresh)
+    cache.get("a")
+    cache.store("c", "cccc", fresh)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    cache.store("d", "x" * 11, fresh)
+    assert cache.get("d") is None
+    cache.store("e", "eeee", {})
+    assert cache.get("e") is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_serves_fresh_and_revalidates_stale():
+    calls = {"plain": 0, "conditional": []}
+
+    async def fetcher(_client, url):
+        calls["plain"] += 1
+        return "body", {"etag": '"v1"', "cache-control": "no-cache"}, {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls["conditional"].append(request.headers.get("if-none-match"))
+        return httpx.Response(304, headers={"cache-control": "max-age=60"})
+
+    cache = ScriptCache(max_bytes=1000)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        url = "https://cdn.example.com/analytics.js"
+        assert await cache.fetch(client, url, fetcher) == "body"
+        # Stored with no-cache: the next read revalidates and gets a 304.
+        assert await cache.fetch(client, url, fetcher) == "body"
+        # The 304 carried max-age so the entry is now fresh.
+        assert await cache.fetch(client, url, fetcher) == "body"
+
+    assert calls["plain"] == 1
+    assert calls["conditional"] == ['"v1"']
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+    assert stats["revalidations"] == 1
+    assert stats["bytes_saved"] == 8
+
+
+@pytest.mark.asyncio
+async def test_bare_304_keeps_the_original_lifetime():
+    conditional = []
+
+    async def fetcher(_client, url):
+        return "body", {"etag": '"v1"', "cache-control": "max-age=60"}, {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        conditional.append(request.headers.get("if-none-match"))
+        return httpx.Response(304, headers={"etag": '"v1"'})
+
+    cache = ScriptCache(max_bytes=1000)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        url = "https://cdn.example.com/analytics.js"
+        await cache.fetch(client, url, fetcher)
+        cache.get(url).expires = 0
+        await cache.fetch(client, url, fetcher)
+        # The 304 had no Cache-Control, so the stored max-age applies again.
+        await cache.fetch(client, url, fetcher)
+
+    assert conditional == ['"v1"']
+    assert cache.get(url).expires > time.time() + 50
+
+
+@pytest.mark.asyncio
+async def test_fetch_rejects_bodies_over_the_limit():
+    async def fetcher(_client, url):
+        return "body", {"etag": '"v1"', "cache-control": "max-age=60"}, {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text="x" * 100, headers={"etag": '"v2"'})
+
+    cache = ScriptCache(max_bytes=1000)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        url = "https://cdn.example.com/launch.js"
+        assert await cache.fetch(client, url, fetcher, limit=4) == "body"
+        with pytest.raises(ScriptTooLarge):
+            await cache.fetch(client, url, fetcher, limit=3)
+        cache.get(url).expires = 0
+        # The revalidation answers with a new body that is too large.
+        with pytest.raises(ScriptTooLarge):
+            await cache.fetch(client, url, fetcher, limit=50)